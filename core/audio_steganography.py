@@ -4,13 +4,17 @@ Módulo para ocultar mensajes en la pista de audio de videos usando esteganograf
 
 import wave
 import os
+import struct
 import subprocess
+import zlib
 import numpy as np
-from scipy.fftpack import dct, idct
+from scipy.fft import dct, idct
 from typing import Tuple, Optional
 from pathlib import Path
 import shutil
 
+from core.media_probe import probe_media
+
 class AudioStegano:
     """
     Clase HÍBRIDA: Maneja tanto AUDIO (.wav) como VIDEO (.mp4, .avi)
@@ -20,11 +24,20 @@ class AudioStegano:
     MAGIC_MARKER = b'STEG_START'
     MAGIC_END = b'STEG_END'
     
+    # Cabecera con longitud: HEADER_MARKER + (versión, flags, longitud) [+ CRC32]
+    # Permite leer exactamente los bloques del mensaje. Los mensajes antiguos
+    # (MAGIC_MARKER + texto + MAGIC_END) se siguen pudiendo extraer.
+    HEADER_MARKER = b'STEG_AHDR'
+    HEADER_FORMAT = '>BBI'
+    HEADER_VERSION = 1
+    FLAG_CRC32 = 0x01
+    
     # --- CONFIGURACIÓN ROBUSTA (Resiste compresión de video) ---
     BLOCK_SIZE = 128  
     P1 = 20          
     P2 = 21          
     MARGIN = 50.0     
+    DECODE_CHUNK_BLOCKS = 16384  # Bloques procesados por lote (acota la memoria usada)
     
     def __init__(self):
         self.temp_dir = Path("temp")
@@ -36,6 +49,14 @@ class AudioStegano:
         """Extrae el audio del video a un WAV temporal."""
         temp_audio = self.temp_dir / "temp_extract.wav"
         
+        # Evitar lanzar FFmpeg si el análisis (cacheado) indica que no hay pista de audio
+        try:
+            if probe_media(video_path)['has_audio'] is False:
+                print("ERROR: El video no contiene pista de audio.")
+                return None
+        except ValueError:
+            pass
+        
         # Verificar si ffmpeg está accesible
         try:
             subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True, check=True)
@@ -118,11 +139,152 @@ class AudioStegano:
 
     # --- LÓGICA CORE ---
 
+    def _build_payload(self, text: str, checksum: bool = True) -> bytes:
+        """Arma el payload: cabecera con longitud (y CRC32 opcional) seguida del texto."""
+        data = text.encode('utf-8')
+        flags = self.FLAG_CRC32 if checksum else 0
+        header = self.HEADER_MARKER + struct.pack(self.HEADER_FORMAT, self.HEADER_VERSION, flags, len(data))
+        if checksum:
+            header += struct.pack('>I', zlib.crc32(data))
+        return header + data
+
+    def _read_payload(self, decode, total_blocks: int) -> Optional[Tuple[bytes, bool]]:
+        """
+        Lee el mensaje decodificando solo los bloques necesarios.
+        `decode(primer_bloque, n_bloques)` debe retornar los bits de esos bloques.
+        
+        Returns:
+            (bytes del mensaje, checksum_ok) o None si no hay mensaje
+        """
+        def read_bytes(first_byte: int, n_bytes: int) -> bytes:
+            n_bytes = min(n_bytes, total_blocks // 8 - first_byte)
+            if n_bytes <= 0:
+                return b''
+            return np.packbits(decode(first_byte * 8, n_bytes * 8)).tobytes()
+
+        header_len = len(self.HEADER_MARKER) + struct.calcsize(self.HEADER_FORMAT)
+        head = read_bytes(0, max(header_len, len(self.MAGIC_MARKER)))
+
+        # 1. Formato con longitud: se decodifican exactamente los bloques del mensaje
+        if head.startswith(self.HEADER_MARKER):
+            version, flags, length = struct.unpack(self.HEADER_FORMAT, head[len(self.HEADER_MARKER):header_len])
+            if version != self.HEADER_VERSION:
+                return None
+            crc_len = 4 if flags & self.FLAG_CRC32 else 0
+            if (header_len + crc_len + length) * 8 > total_blocks:
+                return None
+            body = read_bytes(header_len, crc_len + length)
+            data = body[crc_len:]
+            if crc_len:
+                return data, struct.unpack('>I', body[:crc_len])[0] == zlib.crc32(data)
+            return data, True
+
+        # 2. Formato antiguo al inicio: decodificar por lotes hasta encontrar MAGIC_END
+        if head.startswith(self.MAGIC_MARKER):
+            data = head
+            chunk_bytes = max(1, self.DECODE_CHUNK_BLOCKS // 8)
+            while True:
+                end_idx = data.find(self.MAGIC_END, len(self.MAGIC_MARKER))
+                if end_idx != -1:
+                    return data[len(self.MAGIC_MARKER):end_idx], True
+                more = read_bytes(len(data), chunk_bytes)
+                if not more:
+                    return None
+                data += more
+
+        # 3. Compatibilidad: buscar el marcador antiguo en toda la pista
+        full_data = read_bytes(0, total_blocks // 8)
+        start_idx = full_data.find(self.MAGIC_MARKER)
+        if start_idx != -1:
+            end_idx = full_data.find(self.MAGIC_END, start_idx)
+            if end_idx != -1:
+                return full_data[start_idx + len(self.MAGIC_MARKER):end_idx], True
+        return None
+
+    def _projection(self) -> np.ndarray:
+        """
+        Vector base_P1 - base_P2 de la DCT ortonormal: su producto escalar con un
+        bloque da directamente dct[P1] - dct[P2], sin calcular la DCT completa.
+        """
+        basis = dct(np.eye(self.BLOCK_SIZE), norm='ortho', axis=0)
+        return basis[self.P1] - basis[self.P2]
+
+    def _decode_bits(self, channel: np.ndarray, n_blocks: Optional[int] = None,
+                     first_block: int = 0) -> np.ndarray:
+        """
+        Decodifica un bit por bloque (dct[P1] > dct[P2]) proyectando los bloques,
+        por lotes de DECODE_CHUNK_BLOCKS, sobre el vector de _projection().
+        """
+        available = len(channel) // self.BLOCK_SIZE - first_block
+        n_blocks = available if n_blocks is None else min(n_blocks, available)
+        projection = self._projection()
+        bits = np.empty(max(0, n_blocks), dtype=np.uint8)
+        for first in range(0, n_blocks, self.DECODE_CHUNK_BLOCKS):
+            last = min(first + self.DECODE_CHUNK_BLOCKS, n_blocks)
+            start = (first_block + first) * self.BLOCK_SIZE
+            blocks = channel[start:start + (last - first) * self.BLOCK_SIZE].reshape(-1, self.BLOCK_SIZE)
+            bits[first:last] = (blocks @ projection) > 0
+        return bits
+
+    def _wav_data_offset(self, path: str) -> int:
+        """Retorna el offset en bytes del inicio de las muestras (chunk 'data') de un WAV."""
+        with open(path, 'rb') as f:
+            if f.read(12)[8:12] != b'WAVE':
+                raise ValueError("El archivo no es un WAV válido")
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError("El WAV no contiene datos de audio")
+                chunk_id, size = struct.unpack('<4sI', header)
+                if chunk_id == b'data':
+                    return f.tell()
+                f.seek(size + (size & 1), 1)
+
+    def _decode_wav_blocks(self, wav, first_block: int, n_blocks: int) -> np.ndarray:
+        """Lee del WAV solo los bloques pedidos (canal 0), por lotes, y los decodifica."""
+        n_channels = wav.getnchannels()
+        bits = np.empty(n_blocks, dtype=np.uint8)
+        wav.setpos(first_block * self.BLOCK_SIZE)
+        for first in range(0, n_blocks, self.DECODE_CHUNK_BLOCKS):
+            count = min(self.DECODE_CHUNK_BLOCKS, n_blocks - first)
+            raw = wav.readframes(count * self.BLOCK_SIZE)
+            channel = np.frombuffer(raw, dtype=np.int16).reshape(-1, n_channels)[:, 0].astype(np.float32)
+            decoded = self._decode_bits(channel, count)
+            bits[first:first + len(decoded)] = decoded
+            if len(decoded) < count:
+                return bits[:first + len(decoded)]
+        return bits
+
+    def _embed_bits(self, channel: np.ndarray, bits: np.ndarray):
+        """
+        Inserta los bits en `channel` (in situ), un bit por bloque de BLOCK_SIZE muestras.
+        Todos los bloques se transforman juntos: DCT por lotes (axis=1), ajuste del par
+        de coeficientes P1/P2 con máscaras booleanas y una sola IDCT por lotes.
+        """
+        n_bits = len(bits)
+        region = channel[:n_bits * self.BLOCK_SIZE].reshape(n_bits, self.BLOCK_SIZE)
+        coeffs = dct(region, norm='ortho', axis=1)
+
+        v1 = coeffs[:, self.P1]
+        v2 = coeffs[:, self.P2]
+        center = (v1 + v2) / 2
+        ones = bits.astype(bool)
+        # bit 0 => P2 debe superar a P1 por MARGIN; bit 1 => al revés
+        fix_zero = ~ones & ((v1 >= v2) | ((v2 - v1) < self.MARGIN))
+        fix_one = ones & ((v1 <= v2) | ((v1 - v2) < self.MARGIN))
+        sign = np.where(ones, 1.0, -1.0).astype(coeffs.dtype)
+        fix = fix_zero | fix_one
+        new_v1 = center + sign * self.MARGIN
+        new_v2 = center - sign * self.MARGIN
+        coeffs[fix, self.P1] = new_v1[fix]
+        coeffs[fix, self.P2] = new_v2[fix]
+
+        region[:] = idct(coeffs, norm='ortho', axis=1)
+
     def hide_text_in_audio(self, input_path: str, text: str, output_path: str, progress_callback=None) -> Tuple[bool, str]:
         
         is_video = self._is_video(input_path)
         temp_wav_in = None
-        temp_wav_out = self.temp_dir / "temp_stego.wav"
 
         # 1. Preparar Audio (Extraer si es video)
         if is_video:
@@ -135,77 +297,56 @@ class AudioStegano:
         try:
             # 2. PROCESO DE ESTEGANOGRAFÍA (DCT)
             with wave.open(working_file, 'r') as wav:
-                params = wav.getparams()
                 n_channels = wav.getnchannels()
-                raw = wav.readframes(wav.getnframes())
-                signal = np.frombuffer(raw, dtype=np.int16).astype(np.float32)
 
-            if n_channels > 1:
-                signal = signal.reshape(-1, n_channels)
-                process_channel = signal[:, 0].copy()
-            else:
-                process_channel = signal.copy()
-
-            payload = self.MAGIC_MARKER + text.encode('utf-8') + self.MAGIC_END
-            bits = ''.join(format(b, '08b') for b in payload)
-            
-            # Chequeo de capacidad básico
-            if len(bits) > (len(process_channel) // self.BLOCK_SIZE):
-                return False, "Mensaje demasiado largo para este audio."
-
-            # Inserción
-            for i, bit in enumerate(bits):
-                start = i * self.BLOCK_SIZE
-                end = start + self.BLOCK_SIZE
-                block = process_channel[start:end]
-                dct_block = dct(block, norm='ortho')
-                
-                v1, v2 = dct_block[self.P1], dct_block[self.P2]
+                payload = self._build_payload(text)
+                bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
                 
-                if bit == '0':
-                    if v1 >= v2 or (v2 - v1) < self.MARGIN:
-                        center = (v1 + v2) / 2
-                        dct_block[self.P1] = center - self.MARGIN
-                        dct_block[self.P2] = center + self.MARGIN
-                elif bit == '1':
-                    if v1 <= v2 or (v1 - v2) < self.MARGIN:
-                        center = (v1 + v2) / 2
-                        dct_block[self.P1] = center + self.MARGIN
-                        dct_block[self.P2] = center - self.MARGIN
-
-                process_channel[start:end] = idct(dct_block, norm='ortho')
-                if progress_callback and i % 1000 == 0: progress_callback((i/len(bits))*100)
-
-            # Guardar WAV procesado
-            process_channel = np.clip(process_channel, -32768, 32767)
-            if n_channels > 1:
-                signal[:, 0] = process_channel
-                output_data = signal.astype(np.int16)
-            else:
-                output_data = process_channel.astype(np.int16)
+                # Chequeo de capacidad básico
+                if len(bits) > (wav.getnframes() // self.BLOCK_SIZE):
+                    return False, "Mensaje demasiado largo para este audio."
 
-            with wave.open(str(temp_wav_out), 'w') as wav_out:
-                wav_out.setparams(params)
-                wav_out.writeframes(output_data.tobytes())
+                # Solo cambia la zona del mensaje: el WAV de salida es una copia exacta
+                # (shutil.copyfile usa sendfile/fcopyfile) en la que se sobrescribe esa zona. Si la entrada
+                # es el WAV temporal extraído del video, se modifica directamente.
+                if is_video:
+                    target = working_file
+                else:
+                    target = output_path
+                    if not (os.path.exists(target) and os.path.samefile(working_file, target)):
+                        shutil.copyfile(working_file, target)
+                data_offset = self._wav_data_offset(target)
+
+                with open(target, 'r+b') as f_out:
+                    f_out.seek(data_offset)
+                    # Inserción (vectorizada por bloques) en la zona del mensaje
+                    for first in range(0, len(bits), self.DECODE_CHUNK_BLOCKS):
+                        chunk_bits = bits[first:first + self.DECODE_CHUNK_BLOCKS]
+                        raw = wav.readframes(len(chunk_bits) * self.BLOCK_SIZE)
+                        frames = np.frombuffer(raw, dtype=np.int16).reshape(-1, n_channels).copy()
+                        process_channel = frames[:, 0].astype(np.float32)
+                        self._embed_bits(process_channel, chunk_bits)
+                        frames[:, 0] = np.clip(process_channel, -32768, 32767).astype(np.int16)
+                        f_out.write(frames.tobytes())
+                        if progress_callback:
+                            progress_callback(((first + len(chunk_bits)) / len(bits)) * 90)
 
             # 3. Finalización (Unir o Copiar)
             success = False
             msg = ""
             
             if is_video:
-                if self._merge_audio_to_video(input_path, str(temp_wav_out), output_path):
+                if self._merge_audio_to_video(input_path, working_file, output_path):
                     success = True
                     msg = "Video generado correctamente."
                 else:
                     msg = "Error al unir el video con FFmpeg."
             else:
-                shutil.copy(str(temp_wav_out), output_path)
                 success = True
                 msg = "Audio WAV generado correctamente."
 
             # Limpieza
             if temp_wav_in and os.path.exists(temp_wav_in): os.remove(temp_wav_in)
-            if os.path.exists(temp_wav_out): os.remove(temp_wav_out)
             
             return success, msg
 
@@ -226,55 +367,29 @@ class AudioStegano:
             if not os.path.exists(working_file):
                 return False, "Archivo de audio no accesible", ""
 
+            # Un bit por bloque completo (los bloques incompletos del final se ignoran);
+            # solo se leen del WAV los bloques de la cabecera y del mensaje
             with wave.open(working_file, 'r') as wav:
-                raw = wav.readframes(wav.getnframes())
-                signal = np.frombuffer(raw, dtype=np.int16).astype(np.float32)
-            
-            if wav.getnchannels() > 1:
-                signal = signal.reshape(-1, wav.getnchannels())
-                process_channel = signal[:, 0]
-            else:
-                process_channel = signal
-
-            bits_extracted = []
-            num_blocks = len(process_channel) // self.BLOCK_SIZE
-            
-            for i in range(num_blocks):
-                start = i * self.BLOCK_SIZE
-                end = start + self.BLOCK_SIZE
-                # Protección contra bloques incompletos al final
-                if len(process_channel[start:end]) < self.BLOCK_SIZE: break
-                
-                dct_block = dct(process_channel[start:end], norm='ortho')
-                bits_extracted.append('1' if dct_block[self.P1] > dct_block[self.P2] else '0')
-
-            bits_str = "".join(bits_extracted)
-            byte_list = []
-            for i in range(0, len(bits_str), 8):
-                chunk = bits_str[i:i+8]
-                if len(chunk)==8: byte_list.append(int(chunk, 2))
-            
-            full_data = bytes(byte_list)
-            
-            start_idx = full_data.find(self.MAGIC_MARKER)
-            if start_idx != -1:
-                end_idx = full_data.find(self.MAGIC_END, start_idx)
-                if end_idx != -1:
-                    payload_start = start_idx + len(self.MAGIC_MARKER)
-                    secret_bytes = full_data[payload_start:end_idx]
+                total_blocks = wav.getnframes() // self.BLOCK_SIZE
+                found = self._read_payload(
+                    lambda first, n: self._decode_wav_blocks(wav, first, n), total_blocks
+                )
+            if found is not None:
+                secret_bytes, checksum_ok = found
+                try:
+                    # --- CAMBIO AQUÍ ---
+                    # Usamos errors='replace' para que si un bit falló, 
+                    # el programa no explote y muestre el resto del texto.
+                    secret_text = secret_bytes.decode('utf-8', errors='replace')
+                    
+                    if temp_wav and os.path.exists(temp_wav): os.remove(temp_wav)
+                    if not checksum_ok:
+                        return True, "Mensaje encontrado (⚠️ la suma de verificación no coincide, puede estar dañado).", secret_text
+                    return True, "Mensaje encontrado.", secret_text
                     
-                    try:
-                        # --- CAMBIO AQUÍ ---
-                        # Usamos errors='replace' para que si un bit falló, 
-                        # el programa no explote y muestre el resto del texto.
-                        secret_text = secret_bytes.decode('utf-8', errors='replace')
-                        
-                        if temp_wav and os.path.exists(temp_wav): os.remove(temp_wav)
-                        return True, "Mensaje encontrado.", secret_text
-                        
-                    except Exception as e:
-                        # Esto es por si pasa algo muy raro, pero con 'replace' ya no debería entrar aquí
-                        return False, f"Datos encontrados pero corruptos: {e}", ""
+                except Exception as e:
+                    # Esto es por si pasa algo muy raro, pero con 'replace' ya no debería entrar aquí
+                    return False, f"Datos encontrados pero corruptos: {e}", ""
             
             if temp_wav and os.path.exists(temp_wav): os.remove(temp_wav)
             return False, "No se encontró mensaje oculto.", ""
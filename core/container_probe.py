@@ -0,0 +1,467 @@
+"""
+Lector ligero de cabeceras de contenedores de video (MP4/MOV, Matroska/WebM y AVI).
+
+Obtiene resolución, fps, número de frames, duración, códec y pista de audio leyendo
+solo unas pocas cajas/elementos de la cabecera, sin inicializar ningún decodificador.
+Retorna None si el formato no se reconoce o la cabecera no basta, para que el
+llamador recurra a ffprobe u OpenCV.
+"""
+
+import io
+import struct
+from fractions import Fraction
+from typing import Optional
+
+# Nombres de códec equivalentes a los que reporta ffprobe (codec_name)
+_MP4_VIDEO_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'mp4v': 'mpeg4',
+    'av01': 'av1', 'vp09': 'vp9', 'vp08': 'vp8', 'jpeg': 'mjpeg', 'mjpa': 'mjpeg',
+    'mjpb': 'mjpeg', 'apch': 'prores', 'apcn': 'prores', 'apcs': 'prores',
+    'apco': 'prores', 'ap4h': 'prores', 'FFV1': 'ffv1', 'png ': 'png', 'raw ': 'rawvideo',
+}
+_MP4_AUDIO_CODECS = {
+    'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'Opus': 'opus', 'fLaC': 'flac',
+    '.mp3': 'mp3', 'alac': 'alac', 'sowt': 'pcm_s16le', 'twos': 'pcm_s16be',
+    'lpcm': 'pcm_s16le', 'ulaw': 'pcm_mulaw', 'alaw': 'pcm_alaw',
+}
+_MKV_VIDEO_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_MPEG4/ISO/SP': 'mpeg4',
+    'V_MPEG4/ISO/ASP': 'mpeg4', 'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1',
+    'V_FFV1': 'ffv1', 'V_MJPEG': 'mjpeg', 'V_PRORES': 'prores', 'V_UNCOMPRESSED': 'rawvideo',
+    'V_MPEG2': 'mpeg2video', 'V_MPEG1': 'mpeg1video', 'V_THEORA': 'theora',
+}
+_MKV_AUDIO_CODECS = {
+    'A_AAC': 'aac', 'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_MPEG/L3': 'mp3',
+    'A_MPEG/L2': 'mp2', 'A_AC3': 'ac3', 'A_EAC3': 'eac3', 'A_FLAC': 'flac',
+    'A_DTS': 'dts', 'A_PCM/INT/LIT': 'pcm_s16le', 'A_PCM/INT/BIG': 'pcm_s16be',
+    'A_PCM/FLOAT/IEEE': 'pcm_f32le', 'A_ALAC': 'alac',
+}
+_FOURCC_VIDEO_CODECS = {
+    'FFV1': 'ffv1', 'H264': 'h264', 'X264': 'h264', 'AVC1': 'h264', 'HEVC': 'hevc',
+    'H265': 'hevc', 'XVID': 'mpeg4', 'DIVX': 'mpeg4', 'DX50': 'mpeg4', 'FMP4': 'mpeg4',
+    'MP4V': 'mpeg4', 'MJPG': 'mjpeg', 'HFYU': 'huffyuv', 'FFVH': 'ffvhuff', 'VP80': 'vp8',
+    'VP90': 'vp9', 'AV01': 'av1', 'MPG2': 'mpeg2video', 'PNG ': 'png',
+}
+_WAVE_FORMAT_CODECS = {
+    0x0001: 'pcm_s16le', 0x0003: 'pcm_f32le', 0x0006: 'pcm_alaw', 0x0007: 'pcm_mulaw',
+    0x0050: 'mp2', 0x0055: 'mp3', 0x00FF: 'aac', 0x1610: 'aac', 0x2000: 'ac3', 0x2001: 'dts',
+}
+
+_MP4_TOP_LEVEL = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid'}
+_STTS_MAX_ENTRIES = 4096  # Entradas de stts leídas para estimar la tasa de frames
+
+_EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+_MKV_SEGMENT = 0x18538067
+_MKV_INFO = 0x1549A966
+_MKV_TRACKS = 0x1654AE6B
+_MKV_CLUSTER = 0x1F43B675
+_MKV_TRACK_ENTRY = 0xAE
+_MKV_MAX_ELEMENT = 16 * 1024 * 1024  # Cota para leer Info/Tracks completos
+
+
+def parse_container(path: str) -> Optional[dict]:
+    """
+    Lee la cabecera del contenedor y retorna el mismo dict que MediaProbe.probe
+    (pix_fmt queda en None: solo se conoce decodificando), o None si no se reconoce.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(12)
+            f.seek(0, 2)
+            file_size = f.tell()
+            f.seek(0)
+            if magic[:4] == b'RIFF' and magic[8:12] == b'AVI ':
+                info = _parse_avi(f, file_size)
+            elif magic[:4] == _EBML_MAGIC:
+                info = _parse_matroska(f, file_size)
+            elif magic[4:8] in _MP4_TOP_LEVEL:
+                info = _parse_mp4(f, file_size)
+            else:
+                return None
+    except (OSError, struct.error, ValueError, ZeroDivisionError, UnicodeDecodeError):
+        return None
+
+    if not info or info['width'] <= 0 or info['height'] <= 0 or info['fps'] <= 0:
+        return None
+    if info['total_frames'] <= 0:
+        return None
+    return info
+
+
+def _build_info(width, height, rate: Fraction, total_frames, duration, video_codec,
+                audio) -> dict:
+    return {
+        'width': int(width),
+        'height': int(height),
+        'fps': float(rate),
+        'r_frame_rate': f"{rate.numerator}/{rate.denominator}",
+        'total_frames': int(total_frames),
+        'duration_seconds': duration if duration else (total_frames / float(rate)),
+        'video_codec': video_codec,
+        'pix_fmt': None,
+        'has_audio': audio is not None,
+        'audio': audio,
+    }
+
+
+# --- MP4 / MOV -----------------------------------------------------------------
+
+def _iter_boxes(f, start: int, end: int):
+    """Recorre las cajas entre start y end: (tipo, inicio del contenido, fin de la caja)."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _find_box(f, start: int, end: int, box_type: bytes):
+    for found, payload, box_end in _iter_boxes(f, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+
+def _read_box(f, payload: int, box_end: int, limit: int) -> bytes:
+    f.seek(payload)
+    return f.read(min(box_end - payload, limit))
+
+
+def _parse_mp4(f, file_size: int) -> Optional[dict]:
+    moov = _find_box(f, 0, file_size, b'moov')
+    if moov is None:
+        return None
+
+    video = None
+    audio = None
+    for box_type, payload, box_end in _iter_boxes(f, *moov):
+        if box_type != b'trak':
+            continue
+        track = _parse_mp4_track(f, payload, box_end)
+        if track is None:
+            continue
+        if track['handler'] == b'vide' and video is None:
+            video = track
+        elif track['handler'] == b'soun' and audio is None:
+            audio = track
+
+    if video is None or not video.get('delta') or not video['sample_count']:
+        return None
+
+    rate = Fraction(video['timescale'], video['delta'])
+    duration = video['duration'] / video['timescale'] if video['timescale'] else 0
+    audio_info = None
+    if audio is not None:
+        audio_info = {
+            'codec': _MP4_AUDIO_CODECS.get(audio['format']),
+            'sample_rate': audio.get('sample_rate') or audio['timescale'],
+            'channels': audio.get('channels'),
+        }
+    return _build_info(video['width'], video['height'], rate, video['sample_count'],
+                       duration, _MP4_VIDEO_CODECS.get(video['format']), audio_info)
+
+
+def _parse_mp4_track(f, start: int, end: int) -> Optional[dict]:
+    mdia = _find_box(f, start, end, b'mdia')
+    if mdia is None:
+        return None
+    track = {'timescale': 0, 'duration': 0, 'handler': None, 'format': None,
+             'width': 0, 'height': 0, 'delta': 0, 'sample_count': 0}
+
+    stbl = None
+    for box_type, payload, box_end in _iter_boxes(f, *mdia):
+        if box_type == b'mdhd':
+            data = _read_box(f, payload, box_end, 32)
+            if data[0] == 1:
+                track['timescale'], track['duration'] = struct.unpack('>IQ', data[20:32])
+            else:
+                track['timescale'], track['duration'] = struct.unpack('>II', data[12:20])
+        elif box_type == b'hdlr':
+            track['handler'] = _read_box(f, payload, box_end, 12)[8:12]
+        elif box_type == b'minf':
+            stbl = _find_box(f, payload, box_end, b'stbl')
+    if stbl is None:
+        return track
+
+    for box_type, payload, box_end in _iter_boxes(f, *stbl):
+        if box_type == b'stsd':
+            data = _read_box(f, payload, box_end, 64)
+            track['format'] = data[12:16].decode('latin-1')
+            entry = data[16:]
+            if track['handler'] == b'vide':
+                track['width'], track['height'] = struct.unpack('>HH', entry[24:28])
+            elif track['handler'] == b'soun':
+                track['channels'] = struct.unpack('>H', entry[16:18])[0]
+                track['sample_rate'] = struct.unpack('>I', entry[24:28])[0] >> 16
+        elif box_type == b'stts':
+            data = _read_box(f, payload, box_end, 8 + 8 * _STTS_MAX_ENTRIES)
+            count = min(struct.unpack('>I', data[4:8])[0], (len(data) - 8) // 8)
+            # La duración de frame más frecuente da la tasa base (como r_frame_rate)
+            best = 0
+            for i in range(count):
+                sample_count, delta = struct.unpack('>II', data[8 + 8 * i:16 + 8 * i])
+                if sample_count > best and delta:
+                    best, track['delta'] = sample_count, delta
+        elif box_type == b'stsz':
+            data = _read_box(f, payload, box_end, 12)
+            track['sample_count'] = struct.unpack('>I', data[8:12])[0]
+    return track
+
+
+def mp4_uses_32bit_offsets(path: str) -> Optional[bool]:
+    """
+    Indica si un MP4/MOV usa tablas de offsets de 32 bits (stco) en vez de 64 (co64).
+    Retorna None si el archivo no es MP4/MOV o no se puede leer.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8)[4:8] not in _MP4_TOP_LEVEL:
+                return None
+            f.seek(0, 2)
+            moov = _find_box(f, 0, f.tell(), b'moov')
+            if moov is None:
+                return None
+            for box_type, payload, box_end in _iter_boxes(f, *moov):
+                if box_type != b'trak':
+                    continue
+                mdia = _find_box(f, payload, box_end, b'mdia')
+                minf = _find_box(f, *mdia, b'minf') if mdia else None
+                stbl = _find_box(f, *minf, b'stbl') if minf else None
+                if stbl and _find_box(f, *stbl, b'stco'):
+                    return True
+            return False
+    except (OSError, struct.error):
+        return None
+
+
+# --- Matroska / WebM -----------------------------------------------------------
+
+def _read_vint(f, keep_marker: bool = False):
+    """Lee un entero de longitud variable EBML; retorna (valor, longitud). None = tamaño desconocido."""
+    first = f.read(1)
+    if not first:
+        raise ValueError("EBML truncado")
+    byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not byte & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError("EBML inválido")
+    value = byte if keep_marker else byte & (mask - 1)
+    all_ones = (byte & (mask - 1)) == mask - 1
+    for b in f.read(length - 1):
+        value = (value << 8) | b
+        all_ones = all_ones and b == 0xFF
+    if not keep_marker and all_ones:
+        return None, length
+    return value, length
+
+
+def _iter_elements(f, start: int, end: int):
+    """Recorre elementos EBML: (id, inicio del contenido, fin); fin=None si el tamaño es desconocido."""
+    pos = start
+    while end is None or pos < end:
+        f.seek(pos)
+        element_id, id_len = _read_vint(f, keep_marker=True)
+        size, size_len = _read_vint(f)
+        payload = pos + id_len + size_len
+        if size is None:
+            yield element_id, payload, None
+            return
+        yield element_id, payload, payload + size
+        pos = payload + size
+
+
+def _ebml_uint(data: bytes) -> int:
+    return int.from_bytes(data, 'big') if data else 0
+
+
+def _ebml_float(data: bytes) -> float:
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return 0.0
+
+
+def _ebml_children(data: bytes) -> dict:
+    """Decodifica los hijos directos de un elemento ya leído en memoria: {id: bytes}."""
+    children = {}
+    buf = io.BytesIO(data)
+    for element_id, payload, element_end in _iter_elements(buf, 0, len(data)):
+        if element_end is None:
+            break
+        children.setdefault(element_id, data[payload:element_end])
+    return children
+
+
+def _parse_matroska(f, file_size: int) -> Optional[dict]:
+    segment = None
+    for element_id, payload, element_end in _iter_elements(f, 0, file_size):
+        if element_id == _MKV_SEGMENT:
+            segment = (payload, element_end if element_end is not None else file_size)
+            break
+    if segment is None:
+        return None
+
+    info = tracks = None
+    for element_id, payload, element_end in _iter_elements(f, *segment):
+        if element_id == _MKV_CLUSTER or element_end is None:
+            break
+        if element_id in (_MKV_INFO, _MKV_TRACKS):
+            if element_end - payload > _MKV_MAX_ELEMENT:
+                return None
+            f.seek(payload)
+            data = f.read(element_end - payload)
+            if element_id == _MKV_INFO:
+                info = _ebml_children(data)
+            else:
+                tracks = data
+        if info is not None and tracks is not None:
+            break
+    if info is None or tracks is None:
+        return None
+
+    timecode_scale = _ebml_uint(info.get(0x2AD7B1, b'')) or 1000000
+    duration = _ebml_float(info.get(0x4489, b'')) * timecode_scale / 1e9
+
+    video = audio = None
+    buf = io.BytesIO(tracks)
+    for element_id, payload, element_end in _iter_elements(buf, 0, len(tracks)):
+        if element_id != _MKV_TRACK_ENTRY or element_end is None:
+            continue
+        entry = _ebml_children(tracks[payload:element_end])
+        track_type = _ebml_uint(entry.get(0x83, b''))
+        if track_type == 1 and video is None:
+            video = entry
+        elif track_type == 2 and audio is None:
+            audio = entry
+    if video is None or 0xE0 not in video:
+        return None
+
+    default_duration = _ebml_uint(video.get(0x23E383, b''))
+    if not default_duration or not duration:
+        return None
+    rate = Fraction(10 ** 9, default_duration).limit_denominator(1001)
+    dims = _ebml_children(video[0xE0])
+
+    codec_id = video.get(0x86, b'').decode('ascii', 'replace').rstrip('\x00')
+    video_codec = _MKV_VIDEO_CODECS.get(codec_id)
+    if codec_id == 'V_MS/VFW/FOURCC' and len(video.get(0x63A2, b'')) >= 20:
+        video_codec = _FOURCC_VIDEO_CODECS.get(video[0x63A2][16:20].decode('latin-1').upper())
+
+    audio_info = None
+    if audio is not None:
+        audio_dims = _ebml_children(audio.get(0xE1, b''))
+        audio_info = {
+            'codec': _MKV_AUDIO_CODECS.get(audio.get(0x86, b'').decode('ascii', 'replace')),
+            'sample_rate': int(_ebml_float(audio_dims.get(0xB5, b''))) or 8000,
+            'channels': _ebml_uint(audio_dims.get(0x9F, b'')) or 1,
+        }
+    return _build_info(_ebml_uint(dims.get(0xB0, b'')), _ebml_uint(dims.get(0xBA, b'')), rate,
+                       int(round(duration * float(rate))), duration, video_codec, audio_info)
+
+
+# --- AVI -----------------------------------------------------------------------
+
+def _iter_chunks(f, start: int, end: int):
+    """Recorre chunks RIFF: (fourcc, tipo de LIST o None, inicio del contenido, fin)."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        fourcc, size = struct.unpack('<4sI', f.read(8))
+        chunk_end = min(pos + 8 + size, end)
+        if fourcc == b'LIST':
+            yield fourcc, f.read(4), pos + 12, chunk_end
+        else:
+            yield fourcc, None, pos + 8, chunk_end
+        pos += 8 + size + (size & 1)
+
+
+def _parse_avi(f, file_size: int) -> Optional[dict]:
+    hdrl = None
+    for fourcc, list_type, payload, chunk_end in _iter_chunks(f, 12, file_size):
+        if list_type == b'hdrl':
+            hdrl = (payload, chunk_end)
+            break
+        if list_type == b'movi':
+            break
+    if hdrl is None:
+        return None
+
+    avih = None
+    total_frames_odml = 0
+    video = audio = None
+    for fourcc, list_type, payload, chunk_end in _iter_chunks(f, *hdrl):
+        if fourcc == b'avih':
+            f.seek(payload)
+            avih = struct.unpack('<10I', f.read(40))
+        elif list_type == b'strl':
+            stream = {}
+            for sub, _, sub_payload, sub_end in _iter_chunks(f, payload, chunk_end):
+                f.seek(sub_payload)
+                if sub == b'strh':
+                    stream['strh'] = f.read(min(sub_end - sub_payload, 56))
+                elif sub == b'strf':
+                    stream['strf'] = f.read(min(sub_end - sub_payload, 40))
+            strh = stream.get('strh', b'')
+            if len(strh) < 36:
+                continue
+            if strh[:4] == b'vids' and video is None:
+                video = stream
+            elif strh[:4] == b'auds' and audio is None:
+                audio = stream
+        elif list_type == b'odml':
+            dmlh = _find_chunk(f, payload, chunk_end, b'dmlh')
+            if dmlh is not None:
+                f.seek(dmlh)
+                total_frames_odml = struct.unpack('<I', f.read(4))[0]
+    if avih is None or video is None:
+        return None
+
+    scale, rate_value, _, length = struct.unpack('<4I', video['strh'][20:36])
+    if not scale or not rate_value:
+        return None
+    rate = Fraction(rate_value, scale)
+    total_frames = total_frames_odml or length or avih[4]
+
+    width, height = avih[8], avih[9]
+    video_codec = _FOURCC_VIDEO_CODECS.get(video['strh'][4:8].decode('latin-1').upper())
+    strf = video.get('strf', b'')
+    if len(strf) >= 20:
+        width, height = struct.unpack('<ii', strf[4:12])
+        height = abs(height)
+        video_codec = _FOURCC_VIDEO_CODECS.get(strf[16:20].decode('latin-1').upper(), video_codec)
+
+    audio_info = None
+    if audio is not None:
+        wave = audio.get('strf', b'')
+        if len(wave) >= 8:
+            format_tag, channels, sample_rate = struct.unpack('<HHI', wave[:8])
+        else:
+            format_tag, channels, sample_rate = 0, 0, 0
+        audio_info = {
+            'codec': _WAVE_FORMAT_CODECS.get(format_tag),
+            'sample_rate': sample_rate,
+            'channels': channels,
+        }
+    return _build_info(width, height, rate, total_frames, total_frames / float(rate),
+                       video_codec, audio_info)
+
+
+def _find_chunk(f, start: int, end: int, fourcc: bytes) -> Optional[int]:
+    for found, _, payload, _ in _iter_chunks(f, start, end):
+        if found == fourcc:
+            return payload
+    return None
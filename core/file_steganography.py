@@ -3,14 +3,22 @@ Módulo para ocultar archivos completos dentro de videos usando inyección EOF (
 Permite incrustar cualquier tipo de archivo en el contenedor del video sin modificar los frames es decir sin recodificar.
 """
 
-import cv2
 import numpy as np
+import hashlib
+import io
+import lzma
+import mmap
 import os
 import json
 import shutil
-from typing import Tuple, Optional
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional
 from pathlib import Path
 
+from core.container_probe import mp4_uses_32bit_offsets
+from core.media_probe import probe_media
+
 class FileStegano:
     """Clase para manejar la esteganografía de archivos en videos mediante inyección EOF."""
     
@@ -26,6 +34,35 @@ class FileStegano:
     }
     
     MAGIC_MARKER = b'STEG_EOF_START'  # Marcador para identificar inicio de archivo oculto
+    ARCHIVE_METHOD = 'EOF_ARCHIVE'  # Valor de 'method' en la metadata de un archivo multi-entrada
+    
+    FICLONE = 0x40049409  # ioctl de Linux para clonar (reflink) un archivo en XFS/Btrfs
+    CHUNK_SIZE = 4 * 1024 * 1024  # Tamaño de bloque para copiar y añadir datos (4 MiB)
+    
+    # Compresión opcional del payload: nombre -> (fábrica de compresor, fábrica de descompresor).
+    # El compresor debe tener compress()/flush() y el descompresor decompress() (flush() opcional).
+    COMPRESSION_CODECS = {
+        'zlib': (lambda: zlib.compressobj(6), zlib.decompressobj),
+        'lzma': (lambda: lzma.LZMACompressor(preset=1), lzma.LZMADecompressor),
+    }
+    COMPRESSION_SKIP_CATEGORIES = ('compressed', 'images', 'video', 'audio')  # Ya comprimidos
+    COMPRESSION_MIN_SAVING = 0.10  # Ahorro mínimo en el primer bloque para seguir comprimiendo
+    DECOMPRESS_READ_SIZE = 64 * 1024  # Lectura acotada al descomprimir (limita la expansión en memoria)
+    
+    MAX_METADATA_SIZE = 16 * 1024 * 1024  # Cota para no leer metadata absurda de trailers dañados
+    TRAILER_RESERVE = 1024 * 1024  # Espacio reservado para la metadata del trailer
+    # Tamaño máximo de archivo por sistema de archivos (los no listados se consideran sin límite práctico)
+    FILESYSTEM_MAX_FILE_SIZE = {
+        'vfat': 2 ** 32 - 1, 'msdos': 2 ** 32 - 1, 'fat': 2 ** 32 - 1,
+        'fat32': 2 ** 32 - 1, 'fat16': 2 ** 31 - 1, 'fat12': 2 ** 31 - 1,
+    }
+    MP4_32BIT_WARNING = ("El MP4 usa offsets de 32 bits (stco): si el resultado supera 4 GB, "
+                         "algunos editores o remuxers pueden fallar al procesarlo.")
+    SCAN_WORKERS = 16  # Hilos para escanear directorios (limitado por E/S de metadata)
+    
+    # Integridad: resumen BLAKE2b por bloque de los bytes guardados, verificado en paralelo
+    CHUNK_HASH = 'blake2b-128'
+    VERIFY_WORKERS = min(4, os.cpu_count() or 1)
     
     def __init__(self):
         self.temp_dir = Path("temp")
@@ -33,6 +70,19 @@ class FileStegano:
         self.temp_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
     
+    @classmethod
+    def register_compression_codec(cls, name: str, compressor_factory, decompressor_factory):
+        """
+        Registra un códec de compresión adicional para los payloads EOF.
+        
+        Args:
+            name: Nombre guardado en la metadata
+            compressor_factory: Función sin argumentos que retorna un objeto con compress()/flush()
+            decompressor_factory: Función sin argumentos que retorna un objeto con decompress()
+        """
+        cls.COMPRESSION_CODECS = {**cls.COMPRESSION_CODECS,
+                                  name: (compressor_factory, decompressor_factory)}
+    
     def get_file_category(self, file_path: str) -> str:
         """Obtiene la categoría del archivo basado en su extensión."""
         ext = Path(file_path).suffix.lower()
@@ -63,37 +113,124 @@ class FileStegano:
         
         return True, f"Archivo válido: {category.upper()} ({ext})"
     
-    def calculate_video_capacity(self, video_path: str) -> Tuple[int, dict]:
+    def _filesystem_type(self, path: str) -> Optional[str]:
+        """Retorna el tipo de sistema de archivos que contiene `path` (p. ej. 'ext4', 'vfat', 'FAT32')."""
+        path = os.path.realpath(path)
+        if os.name == 'nt':
+            try:
+                import ctypes
+                root = os.path.splitdrive(path)[0] + '\\'
+                name = ctypes.create_unicode_buffer(64)
+                if ctypes.windll.kernel32.GetVolumeInformationW(root, None, 0, None, None,
+                                                                None, name, len(name)):
+                    return name.value
+            except (ImportError, AttributeError, OSError):
+                pass
+            return None
+        
+        best, fs_type = '', None
+        try:
+            with open('/proc/self/mounts', 'r', encoding='utf-8') as mounts:
+                for line in mounts:
+                    fields = line.split()
+                    if len(fields) < 3:
+                        continue
+                    mount_point = fields[1].replace('\\040', ' ')
+                    prefix = mount_point.rstrip('/') + '/'
+                    if (path == mount_point or path.startswith(prefix)) and len(mount_point) >= len(best):
+                        best, fs_type = mount_point, fields[2]
+        except OSError:
+            pass
+        return fs_type
+    
+    def _destination_capacity(self, video_path: str, output_path: Optional[str] = None,
+                              in_place: bool = False) -> Tuple[int, dict]:
         """
-        Calcula la capacidad de almacenamiento del video.
-        En el método EOF, la capacidad es teóricamente ilimitada, 
-        limitada solo por el sistema de archivos, pero devolvemos datos para la UI.
+        Capacidad del destino sin analizar el video (sirve para cualquier portador):
+        espacio libre del sistema de archivos (menos la copia del video si no es en
+        el lugar) y el tamaño máximo de archivo que admite (p. ej. 4 GB en FAT32).
         
         Returns:
-            Tuple[int, dict]: (capacidad_en_bytes, info_video)
+            Tuple[int, dict]: (capacidad_en_bytes, info) con carrier_size_bytes,
+            free_disk_bytes, carrier_copy_bytes, filesystem, max_file_size_bytes
+            y limited_by ('disk' o 'filesystem')
         """
-        cap = cv2.VideoCapture(video_path)
+        # Una salida que es el propio video se escribe en el lugar (ver _write_eof_payload)
+        if not in_place and output_path and os.path.exists(output_path):
+            in_place = os.path.samefile(video_path, output_path)
+        
+        carrier_size = os.path.getsize(video_path)
+        target = video_path if in_place or not output_path else output_path
+        target_dir = os.path.dirname(os.path.abspath(target))
+        
+        # Espacio libre del destino; sin in_place hay que copiar antes el video completo
+        free_bytes = shutil.disk_usage(target_dir).free
+        copy_bytes = 0 if in_place else carrier_size
+        # Si se sobrescribe otro archivo de salida ya existente, su espacio actual se libera
+        if not in_place and output_path and os.path.exists(output_path):
+            free_bytes += os.path.getsize(output_path)
+        disk_capacity = free_bytes - copy_bytes - self.TRAILER_RESERVE
+        
+        # Límite de tamaño de archivo del sistema de archivos
+        filesystem = self._filesystem_type(target_dir)
+        max_file_size = self.FILESYSTEM_MAX_FILE_SIZE.get((filesystem or '').lower())
+        usable_capacity = disk_capacity
+        limited_by = 'disk'
+        if max_file_size is not None:
+            file_limit_capacity = max_file_size - carrier_size - self.TRAILER_RESERVE
+            if file_limit_capacity < usable_capacity:
+                usable_capacity = file_limit_capacity
+                limited_by = 'filesystem'
+        usable_capacity = max(0, usable_capacity)
+        
+        info = {
+            'carrier_size_bytes': carrier_size,
+            'free_disk_bytes': free_bytes,
+            'carrier_copy_bytes': copy_bytes,
+            'filesystem': filesystem,
+            'max_file_size_bytes': max_file_size,
+            'limited_by': limited_by
+        }
         
-        if not cap.isOpened():
-            # Si no se puede abrir con OpenCV, intentamos devolver datos básicos
-            # O lanzamos error si es crítico. Asumiremos video válido para operaciones de archivo.
-             raise ValueError("No se pudo abrir el video para leer metadata")
+        return usable_capacity, info
+    
+    def calculate_video_capacity(self, video_path: str, output_path: Optional[str] = None,
+                                 in_place: bool = False) -> Tuple[int, dict]:
+        """
+        Calcula la capacidad real de almacenamiento para la inyección EOF.
+        En EOF la capacidad no depende de los pixels sino del destino
+        (ver _destination_capacity); aquí se añade la información del video para la UI.
         
-        # Obtener información del video (solo para mostrar en UI)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        Args:
+            video_path: Ruta del video portador
+            output_path: Ruta de salida prevista (por defecto, junto al video)
+            in_place: Si el archivo se añadirá directamente al video original
         
-        cap.release()
+        Returns:
+            Tuple[int, dict]: (capacidad_en_bytes, info_video); info['warnings']
+            lista los límites del contenedor a tener en cuenta
+        """
+        # Obtener información del video (solo para mostrar en UI), desde la caché compartida
+        video_info = probe_media(video_path)
+        total_frames = video_info['total_frames']
+        fps = video_info['fps']
+        width = video_info['width']
+        height = video_info['height']
         
-        # En EOF, la capacidad no depende de los pixels. 
-        # Ponemos un número muy grande arbitrario o el espacio libre en disco.
-        # Por simplicidad, usamos un valor "virtualmente infinito" para la UI (e.j. 100 GB).
-        usable_capacity = 100 * 1024 * 1024 * 1024  # 100 GB
+        usable_capacity, destination = self._destination_capacity(video_path, output_path, in_place)
+        carrier_size = destination['carrier_size_bytes']
+        filesystem = destination['filesystem']
+        max_file_size = destination['max_file_size_bytes']
         
-        # Algunos reproductores pueden tener problemas con archivos > 4GB si son MP4 antiguos,
-        # pero para propósitos de steganografía moderna, es razonable.
+        warnings = []
+        if max_file_size is not None:
+            warnings.append(
+                f"El destino usa {filesystem}: los archivos no pueden superar "
+                f"{max_file_size / (1024 ** 3):.0f} GB."
+            )
+        mp4_32bit = bool(mp4_uses_32bit_offsets(video_path))
+        if mp4_32bit and carrier_size + usable_capacity >= 2 ** 32:
+            warnings.append(self.MP4_32BIT_WARNING)
         
         info = {
             'total_frames': total_frames,
@@ -101,20 +238,25 @@ class FileStegano:
             'fps': fps,
             'width': width,
             'height': height,
-            'duration_seconds': total_frames / fps if fps > 0 else 0,
+            'duration_seconds': video_info['duration_seconds'],
+            'has_audio': video_info['has_audio'],
             'pixels_per_frame': width * height,
             'bytes_per_frame': 0, # Irrelevante
             'total_capacity_bytes': usable_capacity,
             'usable_capacity_bytes': usable_capacity,
             'total_capacity_mb': usable_capacity / (1024 * 1024),
-            'usable_capacity_mb': usable_capacity / (1024 * 1024)
+            'usable_capacity_mb': usable_capacity / (1024 * 1024),
+            **destination,
+            'mp4_32bit_offsets': mp4_32bit,
+            'warnings': warnings
         }
         
         return usable_capacity, info
     
-    def can_hide_file(self, video_path: str, file_path: str) -> Tuple[bool, str, dict]:
+    def can_hide_file(self, video_path: str, file_path: str, output_path: Optional[str] = None,
+                      in_place: bool = False) -> Tuple[bool, str, dict]:
         """
-        Verifica si el archivo cabe en el video.
+        Verifica si el archivo cabe en el destino antes de empezar a copiar.
         
         Returns:
             Tuple[bool, str, dict]: (puede_ocultar, mensaje, info)
@@ -126,10 +268,9 @@ class FileStegano:
         
         # Obtener tamaños
         file_size = os.path.getsize(file_path)
-        capacity, video_info = self.calculate_video_capacity(video_path)
+        capacity, video_info = self.calculate_video_capacity(video_path, output_path, in_place)
         
-        # Calcular porcentaje de uso (simbólico, ya que capacity es ficticio)
-        usage_percent = (file_size / capacity * 100) if capacity > 0 else 0.1
+        usage_percent = (file_size / capacity * 100) if capacity > 0 else 100.0
         
         info = {
             **video_info,
@@ -140,204 +281,1018 @@ class FileStegano:
             'remaining_mb': (capacity - file_size) / (1024 * 1024)
         }
         
+        if file_size > capacity:
+            reason = ("el sistema de archivos del destino no admite un archivo tan grande"
+                      if video_info['limited_by'] == 'filesystem'
+                      else "no hay suficiente espacio libre en el disco de destino")
+            msg = (f"❌ El archivo no cabe: {reason}.\n\n"
+                   f"📁 Archivo: {file_size / (1024*1024):.2f} MB\n"
+                   f"💾 Capacidad disponible: {capacity / (1024*1024):.2f} MB")
+            return False, msg, info
+        
         msg = (f"✅ El archivo se puede inyectar (EOF).\n\n"
-               f"📁 Archivo: {file_size / (1024*1024):.2f} MB\n"
+               f"📁 Archivo: {file_size / (1024*1024):.2f} MB ({usage_percent:.1f}% de la capacidad)\n"
                f"ℹ️ Método: Inyección en contenedor (No modifica frames)\n"
                f"El video resultante será reproducible, pero el archivo oculto\n"
                f"se perderá si el video es convertido o re-comprimido.")
+        for warning in video_info['warnings']:
+            # El aviso de offsets de 32 bits solo aplica si el resultado supera 4 GB
+            if warning == self.MP4_32BIT_WARNING and video_info['carrier_size_bytes'] + file_size < 2 ** 32:
+                continue
+            msg += f"\n⚠️ {warning}"
         
         return True, msg, info
     
+    def _copy_range(self, f_src, f_dst, offset: int, length: int, progress=None) -> str:
+        """
+        Copia `length` bytes de `f_src` desde `offset` a la posición actual de `f_dst`
+        sin pasar los datos por espacio de usuario cuando es posible.
+        Intenta, en orden: os.copy_file_range, os.sendfile y bloques sobre una vista mmap.
+        `progress(bytes_copiados)` se llama tras cada bloque copiado.
+        
+        Returns:
+            str: Método de copia utilizado
+        """
+        f_dst.flush()
+        dst_start = f_dst.tell()
+        step = self.CHUNK_SIZE * 16
+        
+        # 1. Copia dentro del kernel
+        for name in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, name):
+                continue
+            try:
+                copied = 0
+                while copied < length:
+                    count = min(step, length - copied)
+                    if name == 'copy_file_range':
+                        sent = os.copy_file_range(f_src.fileno(), f_dst.fileno(), count,
+                                                  offset + copied)
+                    else:
+                        sent = os.sendfile(f_dst.fileno(), f_src.fileno(), offset + copied, count)
+                    if sent == 0:
+                        break
+                    copied += sent
+                    if progress:
+                        progress(copied)
+                if copied == length:
+                    f_dst.seek(dst_start + length)
+                    return name
+            except OSError:
+                pass
+            # Reiniciar el destino antes de probar el siguiente método
+            f_dst.seek(dst_start)
+            f_dst.truncate()
+        
+        # 2. Copia por bloques sobre una vista mmap (sin lecturas adicionales al heap)
+        if length == 0:
+            return 'mmap'
+        with mmap.mmap(f_src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                copied = 0
+                while copied < length:
+                    count = min(self.CHUNK_SIZE, length - copied)
+                    f_dst.write(view[offset + copied:offset + copied + count])
+                    copied += count
+                    if progress:
+                        progress(copied)
+            finally:
+                view.release()
+        return 'mmap'
+    
+    def _copy_carrier(self, src: str, dst: str, progress=None) -> str:
+        """
+        Copia el video portador evitando pasar los datos por espacio de usuario.
+        Intenta, en orden: clon reflink (FICLONE), copia dentro del kernel
+        (ver _copy_range) y por último shutil.copyfile. Conserva los metadatos como shutil.copy2.
+        `progress(bytes_copiados)` se llama tras cada bloque copiado.
+        
+        Returns:
+            str: Método de copia utilizado
+        """
+        # Abrir el destino con 'wb' vaciaría el propio video (como shutil.copy2)
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            raise shutil.SameFileError(f"{src} y {dst} son el mismo archivo")
+        
+        method = None
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            # 1. Reflink: operación solo de metadatos en sistemas de archivos CoW
+            try:
+                import fcntl
+                fcntl.ioctl(f_dst.fileno(), self.FICLONE, f_src.fileno())
+                method = 'reflink'
+            except (ImportError, OSError):
+                pass
+            
+            # 2. Copia dentro del kernel
+            if method is None:
+                try:
+                    size = os.fstat(f_src.fileno()).st_size
+                    method = self._copy_range(f_src, f_dst, 0, size, progress)
+                except (OSError, ValueError):
+                    f_dst.seek(0)
+                    f_dst.truncate()
+        
+        # 3. Copia convencional
+        if method is None:
+            shutil.copyfile(src, dst)
+            method = 'copyfile'
+        if progress:
+            progress(os.path.getsize(src))
+        shutil.copystat(src, dst)
+        return method
+    
+    def _choose_compression(self, file_path: str, compression: Optional[str]) -> Optional[str]:
+        """Retorna el códec a usar para `file_path` o None si no vale la pena comprimirlo."""
+        if not compression:
+            return None
+        if compression not in self.COMPRESSION_CODECS:
+            raise ValueError(f"Códec de compresión desconocido: {compression}")
+        if self.get_file_category(file_path) in self.COMPRESSION_SKIP_CATEGORIES:
+            return None
+        return compression
+    
+    def _sample_compression(self, codec: str, sample, final: bool = False):
+        """
+        Comprime una muestra (el primer bloque) y decide si el ahorro compensa.
+        Si compensa, retorna (compresor, salida) para continuar el flujo con el mismo
+        compresor; si no, None. Con `final` (la muestra es el archivo entero) el flujo
+        se cierra con flush(); si no, lo que el compresor retiene es despreciable
+        frente a un bloque completo.
+        """
+        compressor = self.COMPRESSION_CODECS[codec][0]()
+        out = compressor.compress(sample)
+        if final:
+            out += compressor.flush()
+        if len(out) > len(sample) * (1 - self.COMPRESSION_MIN_SAVING):
+            return None
+        return compressor, out
+    
+    def _ensure_capacity(self, required: int, capacity: int, limited_by: str):
+        """Lanza IOError si `required` bytes no caben en la capacidad del destino."""
+        if required > capacity:
+            raise IOError(
+                f"Espacio insuficiente en el destino ({limited_by}): "
+                f"se necesitan {required / (1024 * 1024):.2f} MB y hay "
+                f"{max(0, capacity) / (1024 * 1024):.2f} MB disponibles"
+            )
+    
+    def _write_eof_payload(self, video_path: str, file_paths: List[str], output_path: str,
+                           build_metadata, progress_callback=None, in_place: bool = False,
+                           bytes_callback=None, compression: Optional[str] = None) -> Tuple[str, str, dict]:
+        """
+        Copia el video (salvo in_place) y añade los archivos uno tras otro en una sola
+        pasada, seguidos del trailer: Metadata + MetadataLength(4) + MAGIC_MARKER.
+        Cada archivo se lee por bloques con un buffer reutilizable y, en la misma pasada,
+        se calcula su SHA-256 y un resumen BLAKE2b por cada CHUNK_SIZE bytes guardados.
+        Si se pide `compression`, se comprime al vuelo cuando el primer bloque lo justifica.
+        
+        Args:
+            build_metadata: Función que recibe una lista de dicts por archivo (offset,
+                            filesize, sha256, resúmenes por bloque y compression/stored_size
+                            si aplica)
+                            y retorna el dict de metadata
+        
+        Returns:
+            Tuple[str, str, dict]: (ruta de salida, método de copia, metadata)
+        """
+        original_size = None
+        created_output = False
+        # Si la salida es el propio video, añadir en el lugar en vez de copiarlo sobre sí mismo
+        if not in_place and os.path.exists(output_path) and os.path.samefile(video_path, output_path):
+            in_place = True
+        try:
+            sizes = [os.path.getsize(path) for path in file_paths]
+            codecs = [self._choose_compression(path, compression) for path in file_paths]
+            
+            # Fallar antes de copiar si el destino no tiene espacio o límite suficiente
+            # (con compresión solo se puede comprobar la copia del video)
+            capacity, capacity_info = self._destination_capacity(video_path, output_path, in_place)
+            self._ensure_capacity(0 if any(codecs) else sum(sizes), capacity,
+                                  capacity_info['limited_by'])
+            
+            # Progreso en bytes: copia del video (si aplica) + archivos ocultos
+            carrier_bytes = 0 if in_place else os.path.getsize(video_path)
+            total_bytes = max(1, carrier_bytes + sum(sizes))
+            
+            def report(done_bytes):
+                if progress_callback:
+                    progress_callback(int(done_bytes * 100 / total_bytes))
+                if bytes_callback:
+                    bytes_callback(done_bytes, total_bytes)
+            
+            # Copiar el video original al destino primero (sin copia si es en el lugar)
+            if in_place:
+                output_path = video_path
+                copy_method = 'in-place'
+            else:
+                # Registrar la copia para limpiarla aunque falle a mitad de camino
+                created_output = True
+                copy_method = self._copy_carrier(video_path, output_path, report)
+            original_size = os.path.getsize(output_path)
+            
+            # Añadir los archivos por bloques, sin cargarlos enteros en memoria
+            buffer = bytearray(self.CHUNK_SIZE)
+            view = memoryview(buffer)
+            done = carrier_bytes
+            entries = []
+            with open(output_path, 'ab') as f_out:
+                offset = 0
+                for path, expected, codec in zip(file_paths, sizes, codecs):
+                    digest = hashlib.sha256()
+                    chunk_digests = _ChunkDigests(self.CHUNK_SIZE)
+                    compressor = None
+                    finished = False
+                    written = 0
+                    stored = 0
+                    with open(path, 'rb') as f_in:
+                        while True:
+                            n = f_in.readinto(buffer)
+                            if not n:
+                                break
+                            chunk = view[:n]
+                            if written == 0 and codec:
+                                # Muestrear el primer bloque: si comprime mal, se guarda tal cual
+                                finished = n >= expected
+                                sampled = self._sample_compression(codec, chunk, finished)
+                                if sampled:
+                                    compressor, out = sampled
+                                else:
+                                    codec = None
+                                    out = chunk
+                            else:
+                                out = compressor.compress(chunk) if compressor else chunk
+                            f_out.write(out)
+                            digest.update(chunk)
+                            chunk_digests.update(out)
+                            stored += len(out)
+                            written += n
+                            done += n
+                            report(done)
+                        if compressor and not finished:
+                            out = compressor.flush()
+                            f_out.write(out)
+                            chunk_digests.update(out)
+                            stored += len(out)
+                    if written != expected:
+                        raise IOError(f"El archivo cambió de tamaño durante la copia: {path}")
+                    
+                    entry = {'offset': offset, 'filesize': written, 'sha256': digest.hexdigest()}
+                    if compressor:
+                        entry['compression'] = codec
+                        entry['stored_size'] = stored
+                    entry['chunk_hash'] = self.CHUNK_HASH
+                    entry['chunk_size'] = self.CHUNK_SIZE
+                    entry['chunk_digests'] = chunk_digests.finish()
+                    entries.append(entry)
+                    offset += stored
+                
+                # Diseño para robustez:
+                # VideoOriginal + Archivos + Metadata + MetadataLength + MAGIC_MARKER
+                # Así podemos leer los últimos bytes para saber si hay algo oculto.
+                metadata = build_metadata(entries)
+                metadata_json = json.dumps(metadata).encode('utf-8')
+                metadata_len_bytes = len(metadata_json).to_bytes(4, byteorder='big')
+                f_out.write(metadata_json + metadata_len_bytes + self.MAGIC_MARKER)
+            
+            report(total_bytes)
+            return output_path, copy_method, metadata
+        
+        except Exception:
+            # No dejar datos a medias: restaurar el original o eliminar la copia
+            if created_output:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            elif original_size is not None:
+                os.truncate(output_path, original_size)
+            raise
+    
     def hide_file_in_video(self, video_path: str, file_path: str, output_path: str, 
-                          progress_callback=None) -> Tuple[bool, str]:
+                          progress_callback=None, in_place: bool = False,
+                          bytes_callback=None, compression: Optional[str] = None) -> Tuple[bool, str]:
         """
         Oculta un archivo completo dentro de un video usando inyección EOF.
         
         Args:
             video_path: Ruta del video original
             file_path: Ruta del archivo a ocultar
-            output_path: Ruta del video de salida
+            output_path: Ruta del video de salida (se ignora si in_place=True)
+            progress_callback: Función callback para reportar progreso (0-100),
+                               calculado sobre los bytes procesados
+            in_place: Si es True, añade el archivo directamente al video original
+                      sin copiarlo (el video original queda modificado)
+            bytes_callback: Función opcional (bytes_procesados, bytes_totales)
+            compression: Códec opcional ('zlib', 'lzma' o uno registrado); se omite
+                         en archivos ya comprimidos o si el primer bloque no comprime
+        
+        Returns:
+            Tuple[bool, str]: (éxito, mensaje)
+        """
+        try:
+            def build_metadata(entries):
+                entry = dict(entries[0])
+                del entry['offset']
+                return {
+                    'filename': os.path.basename(file_path),
+                    'extension': Path(file_path).suffix,
+                    'method': 'EOF',
+                    **entry
+                }
+            
+            output_path, copy_method, metadata = self._write_eof_payload(
+                video_path, [file_path], output_path, build_metadata,
+                progress_callback, in_place, bytes_callback, compression
+            )
+            
+            success_msg = (
+                f"✅ ¡Archivo ocultado exitosamente (EOF)!\n\n"
+                f"📁 Archivo: {metadata['filename']}\n"
+                f"📦 Tamaño: {metadata['filesize'] / 1024:.2f} KB\n"
+                f"💾 Video guardado en: {output_path}\n"
+                f"⚙️ Copia del video: {copy_method}\n"
+                f"{self._compression_summary([metadata])}\n"
+                f"⚠️ ADVERTENCIA: No conviertas ni comprimas este video, o perderás el archivo."
+            )
+            
+            return True, success_msg
+            
+        except Exception as e:
+            return False, f"Error al ocultar archivo: {str(e)}"
+    
+    def _compression_summary(self, entries: List[dict]) -> str:
+        """Línea del mensaje de éxito con el ahorro obtenido por la compresión."""
+        compressed = [entry for entry in entries if entry.get('compression')]
+        if not compressed:
+            return ""
+        original = sum(entry['filesize'] for entry in compressed)
+        stored = sum(entry['stored_size'] for entry in compressed)
+        codecs = ', '.join(sorted({entry['compression'] for entry in compressed}))
+        return (f"🗜️ Compresión ({codecs}): {original / 1024:.2f} KB → {stored / 1024:.2f} KB "
+                f"en {len(compressed)} archivo(s)\n")
+    
+    def _collect_files(self, paths: List[str]) -> List[Tuple[str, str]]:
+        """
+        Expande archivos y directorios a una lista de (ruta, nombre dentro del archivo).
+        Los directorios se recorren recursivamente y conservan su ruta relativa.
+        """
+        collected = []
+        for path in paths:
+            if os.path.isdir(path):
+                root = Path(path)
+                for file in sorted(p for p in root.rglob('*') if p.is_file()):
+                    name = (Path(root.name) / file.relative_to(root)).as_posix()
+                    collected.append((str(file), name))
+            else:
+                collected.append((path, os.path.basename(path)))
+        return collected
+    
+    def hide_files_in_video(self, video_path: str, file_paths: List[str], output_path: str,
+                            progress_callback=None, in_place: bool = False,
+                            bytes_callback=None, compression: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Oculta varios archivos (o directorios completos) en un solo paso de E/S.
+        Los archivos se añaden uno tras otro y el trailer incluye una tabla de
+        contenidos con offset, tamaño y SHA-256 de cada entrada, de modo que cada
+        una puede extraerse por separado sin leer las demás.
+        
+        Args:
+            video_path: Ruta del video original
+            file_paths: Rutas de archivos y/o directorios a ocultar
+            output_path: Ruta del video de salida (se ignora si in_place=True)
             progress_callback: Función callback para reportar progreso (0-100)
+            in_place: Si es True, añade los archivos directamente al video original
+            bytes_callback: Función opcional (bytes_procesados, bytes_totales)
+            compression: Códec opcional, decidido por archivo (ver hide_file_in_video)
         
         Returns:
             Tuple[bool, str]: (éxito, mensaje)
         """
         try:
-            if progress_callback:
-                progress_callback(10)
+            files = self._collect_files(file_paths)
+            if not files:
+                return False, "No hay archivos para ocultar."
+            names = [name for _, name in files]
+            if len(set(names)) != len(names):
+                return False, "Hay archivos repetidos con el mismo nombre."
             
-            # Leer el archivo a ocultar
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
+            def build_metadata(entries):
+                toc = [
+                    {'filename': name, 'extension': Path(name).suffix, **entry}
+                    for name, entry in zip(names, entries)
+                ]
+                return {
+                    'filename': f"{Path(video_path).stem}_archivos",
+                    'filesize': sum(entry['filesize'] for entry in toc),
+                    'stored_size': sum(entry.get('stored_size', entry['filesize']) for entry in toc),
+                    'method': self.ARCHIVE_METHOD,
+                    'entries': toc
+                }
             
-            if progress_callback:
-                progress_callback(30)
-                
-            # Crear metadata
-            metadata = {
-                'filename': os.path.basename(file_path),
-                'filesize': len(file_data),
-                'extension': Path(file_path).suffix,
-                'method': 'EOF'
-            }
-            metadata_json = json.dumps(metadata).encode('utf-8')
+            output_path, copy_method, metadata = self._write_eof_payload(
+                video_path, [path for path, _ in files], output_path, build_metadata,
+                progress_callback, in_place, bytes_callback, compression
+            )
             
-            # Convertir longitudes a bytes (4 bytes big endian)
-            metadata_len_bytes = len(metadata_json).to_bytes(4, byteorder='big')
+            success_msg = (
+                f"✅ ¡Archivos ocultados exitosamente (EOF)!\n\n"
+                f"📁 Archivos: {len(metadata['entries'])}\n"
+                f"📦 Tamaño total: {metadata['filesize'] / 1024:.2f} KB\n"
+                f"💾 Video guardado en: {output_path}\n"
+                f"⚙️ Copia del video: {copy_method}\n"
+                f"{self._compression_summary(metadata['entries'])}\n"
+                f"⚠️ ADVERTENCIA: No conviertas ni comprimas este video, o perderás los archivos."
+            )
             
-            # Construir el payload a inyectar al final
-            # Payload = MAGIC_MARKER + metadata_len(4) + metadata + file_data
-            # Al extraer, buscaremos MAGIC_MARKER de atrás hacia adelante o
-            # simplemente concatenamos en un orden conocido.
+            return True, success_msg
             
-            # Diseño simple para lectura secuencial inversa o búsqueda:
-            # VideoOriginal + [MAGIC_MARKER + MetadataLength + Metadata + SecretFile]
+        except Exception as e:
+            return False, f"Error al ocultar archivos: {str(e)}"
+    
+    def remove_hidden_file(self, video_path: str) -> Tuple[bool, str]:
+        """
+        Elimina los archivos ocultos de un video truncándolo, en el lugar, a la
+        longitud original calculada a partir del trailer (no se copia el video).
+        
+        Returns:
+            Tuple[bool, str]: (éxito, mensaje)
+        """
+        try:
+            file_size = os.path.getsize(video_path)
+            with open(video_path, 'rb') as f:
+                try:
+                    metadata, payload_offset = self._read_trailer(f, file_size)
+                except ValueError as e:
+                    return False, str(e)
+            entries = self._entries_from_metadata(metadata)
             
-            # Mejor diseño para robustez: 
-            # VideoOriginal + SecretFile + Metadata + MetadataLength + MAGIC_MARKER
-            # Así podemos leer los últimos bytes para saber si hay algo oculto.
+            os.truncate(video_path, payload_offset)
             
-            payload = (
-                file_data +
-                metadata_json +
-                metadata_len_bytes + 
-                self.MAGIC_MARKER 
+            return True, (
+                f"✅ Archivos ocultos eliminados: {len(entries)}\n\n"
+                f"📦 Bytes liberados: {(file_size - payload_offset) / 1024:.2f} KB\n"
+                f"💾 Video restaurado: {video_path}"
             )
+        except Exception as e:
+            return False, f"Error al eliminar el archivo oculto: {str(e)}"
+    
+    def replace_hidden_file(self, video_path: str, file_path, progress_callback=None,
+                            bytes_callback=None, compression: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Reemplaza, en el lugar, los archivos ocultos de un video: trunca el payload
+        actual y añade el nuevo por bloques. El costo depende del payload, no del video.
+        
+        Args:
+            video_path: Ruta del video con archivo oculto (se modifica)
+            file_path: Ruta del nuevo archivo, o lista de archivos/directorios
+            progress_callback: Función callback para reportar progreso (0-100)
+            bytes_callback: Función opcional (bytes_procesados, bytes_totales)
+            compression: Códec opcional (ver hide_file_in_video)
+        
+        Returns:
+            Tuple[bool, str]: (éxito, mensaje)
+        """
+        # Validar el reemplazo antes de truncar para no perder el payload actual
+        new_paths = [file_path] if isinstance(file_path, (str, os.PathLike)) else list(file_path)
+        for path in new_paths:
+            if not os.path.exists(path):
+                return False, f"El archivo no existe: {path}"
+        try:
+            files = self._collect_files(new_paths)
+            if not files:
+                return False, "No hay archivos para ocultar."
+            names = [name for _, name in files]
+            if len(set(names)) != len(names):
+                return False, "Hay archivos repetidos con el mismo nombre."
+            codecs = [self._choose_compression(path, compression) for path, _ in files]
+            required = 0 if any(codecs) else sum(os.path.getsize(path) for path, _ in files)
             
-            if progress_callback:
-                progress_callback(50)
+            file_size = os.path.getsize(video_path)
+            with open(video_path, 'rb') as f:
+                try:
+                    _, payload_offset = self._read_trailer(f, file_size)
+                except ValueError as e:
+                    return False, str(e)
+            # El payload actual se libera al truncar antes de escribir el nuevo
+            capacity, capacity_info = self._destination_capacity(video_path, in_place=True)
+            self._ensure_capacity(required, capacity + file_size - payload_offset,
+                                  capacity_info['limited_by'])
+        except Exception as e:
+            return False, f"Error al reemplazar el archivo oculto: {str(e)}"
+        
+        success, msg = self.remove_hidden_file(video_path)
+        if not success:
+            return False, msg
+        
+        if isinstance(file_path, (str, os.PathLike)) and os.path.isfile(file_path):
+            return self.hide_file_in_video(video_path, file_path, video_path, progress_callback,
+                                           in_place=True, bytes_callback=bytes_callback,
+                                           compression=compression)
+        return self.hide_files_in_video(video_path, new_paths, video_path, progress_callback,
+                                        in_place=True, bytes_callback=bytes_callback,
+                                        compression=compression)
+    
+    def _read_trailer(self, f, file_size: int) -> Tuple[dict, int]:
+        """
+        Lee el trailer EOF de un video abierto en modo binario.
+        La estructura es: ... + Archivo + Metadata + MetadataLength(4) + MAGIC_MARKER
+        
+        Returns:
+            Tuple[dict, int]: (metadata, offset absoluto del archivo oculto)
+        
+        Raises:
+            ValueError: con el mensaje a mostrar si no hay un archivo oculto válido
+        """
+        # 1. Buscar el MAGIC_MARKER al final del archivo
+        marker_len = len(self.MAGIC_MARKER)
+        seek_offset = marker_len + 4
+        if file_size < seek_offset:
+            raise ValueError("No se encontró el marcador de archivo oculto (EOF) en este video.")
+        
+        # 2. Leer la longitud de la metadata y el marcador de una vez
+        f.seek(-seek_offset, 2)
+        tail = f.read(seek_offset)
+        if tail[4:] != self.MAGIC_MARKER:
+            raise ValueError("No se encontró el marcador de archivo oculto (EOF) en este video.")
+        metadata_len = int.from_bytes(tail[:4], byteorder='big')
+        
+        # 3. Leer la metadata
+        seek_offset += metadata_len
+        if file_size < seek_offset or metadata_len > self.MAX_METADATA_SIZE:
+            raise ValueError("Metadata corrupta.")
+        f.seek(-seek_offset, 2)
+        try:
+            metadata = json.loads(f.read(metadata_len).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("Error al decodificar la metadata.")
+        
+        hidden_file_size = metadata.get('stored_size', metadata.get('filesize', 0))
+        if hidden_file_size <= 0:
+            raise ValueError("Tamaño de archivo inválido en metadata.")
+        
+        # 4. Ubicar el archivo oculto
+        seek_offset += hidden_file_size
+        if file_size < seek_offset:
+            raise ValueError("El archivo parece estar truncado.")
+        return metadata, file_size - seek_offset
+    
+    def _entries_from_metadata(self, metadata: dict) -> List[dict]:
+        """
+        Retorna la tabla de contenidos del payload. Los offsets son relativos al
+        inicio del payload; un video con un solo archivo se trata como una entrada.
+        """
+        if metadata.get('method') == self.ARCHIVE_METHOD:
+            return metadata.get('entries', [])
+        entry = {key: value for key, value in metadata.items() if key != 'method'}
+        entry.setdefault('filename', 'extracted_file')
+        entry.setdefault('extension', '')
+        entry.setdefault('sha256', None)
+        entry['offset'] = 0
+        return [entry]
+    
+    def _find_entry(self, metadata: dict, filename: Optional[str]) -> dict:
+        entries = self._entries_from_metadata(metadata)
+        if filename is None:
+            if len(entries) != 1:
+                raise ValueError("El video contiene varios archivos; indica cuál abrir.")
+            return entries[0]
+        for entry in entries:
+            if entry['filename'] == filename:
+                return entry
+        raise ValueError(f"No se encontró '{filename}' entre los archivos ocultos.")
+    
+    def list_hidden_files(self, video_path: str) -> Tuple[bool, str, List[dict]]:
+        """
+        Lista los archivos ocultos leyendo solo el trailer del video.
+        
+        Returns:
+            Tuple[bool, str, List[dict]]: (éxito, mensaje, entradas con
+            filename, offset, filesize, extension y sha256)
+        """
+        try:
+            with open(video_path, 'rb') as f:
+                try:
+                    metadata, _ = self._read_trailer(f, os.fstat(f.fileno()).st_size)
+                except ValueError as e:
+                    return False, str(e), []
+            entries = self._entries_from_metadata(metadata)
+            
+            msg = f"📋 Archivos ocultos: {len(entries)}\n\n"
+            for entry in entries:
+                msg += f"• {entry['filename']} ({entry['filesize'] / 1024:.2f} KB)\n"
+            return True, msg, entries
+        
+        except Exception as e:
+            return False, f"Error al leer los archivos ocultos: {str(e)}", []
+    
+    def _scan_carrier(self, path: str) -> List[dict]:
+        """
+        Lee solo el trailer de `path` y retorna un registro por archivo oculto
+        (lista vacía si no contiene el marcador EOF).
+        """
+        try:
+            with open(path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                marker_len = len(self.MAGIC_MARKER)
+                if file_size < marker_len:
+                    return []
+                f.seek(-marker_len, 2)
+                if f.read(marker_len) != self.MAGIC_MARKER:
+                    return []
+                metadata, payload_offset = self._read_trailer(f, file_size)
             
-            # Copiar el video original al destino primero (o leer y escribir)
-            shutil.copy2(video_path, output_path)
+            return [
+                {
+                    'path': path,
+                    'filename': entry['filename'],
+                    'filesize': entry['filesize'],
+                    'stored_size': entry.get('stored_size', entry['filesize']),
+                    'offset': payload_offset + entry['offset'],
+                    'method': metadata.get('method', 'EOF'),
+                    'compression': entry.get('compression'),
+                    'sha256': entry.get('sha256'),
+                }
+                for entry in self._entries_from_metadata(metadata)
+            ]
+        except Exception as e:
+            # Un trailer dañado o con campos inesperados no debe detener el escaneo
+            return [{'path': path, 'error': str(e) or type(e).__name__}]
+    
+    def scan_directory(self, root_dir: str, report_path: Optional[str] = None,
+                       extensions: Optional[List[str]] = None,
+                       progress_callback=None) -> Tuple[bool, str, List[dict]]:
+        """
+        Recorre un árbol de directorios buscando videos con archivos ocultos (EOF).
+        De cada archivo solo se leen los bytes del trailer (marcador, longitud y
+        metadata) en un pool de hilos, sin tocar el payload.
+        
+        Args:
+            root_dir: Directorio a recorrer recursivamente
+            report_path: Archivo JSON Lines opcional donde escribir un registro por
+                         archivo oculto (path, filename, filesize, offset, ...)
+            extensions: Extensiones a revisar (por defecto, las de video soportadas);
+                        una lista vacía revisa todos los archivos
+            progress_callback: Función callback para reportar progreso (0-100)
+        
+        Returns:
+            Tuple[bool, str, List[dict]]: (éxito, mensaje, registros encontrados)
+        """
+        if not os.path.isdir(root_dir):
+            return False, "El directorio no existe", []
+        if extensions is None:
+            extensions = self.SUPPORTED_FORMATS['video']
+        extensions = {ext.lower() for ext in extensions}
+        
+        try:
+            paths = []
+            for dirpath, _, filenames in os.walk(root_dir):
+                for name in filenames:
+                    if not extensions or Path(name).suffix.lower() in extensions:
+                        paths.append(os.path.join(dirpath, name))
             
-            if progress_callback:
-                progress_callback(70)
+            records = []
+            report = open(report_path, 'w', encoding='utf-8') if report_path else None
+            try:
+                with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS) as pool:
+                    for i, found in enumerate(pool.map(self._scan_carrier, paths), 1):
+                        for record in found:
+                            records.append(record)
+                            if report:
+                                report.write(json.dumps(record, ensure_ascii=False) + '\n')
+                        if progress_callback:
+                            progress_callback(int(i * 100 / len(paths)))
+            finally:
+                if report:
+                    report.close()
+        except Exception as e:
+            return False, f"Error al escanear el directorio: {str(e)}", []
+        
+        carriers = len({record['path'] for record in records if 'error' not in record})
+        errors = sum(1 for record in records if 'error' in record)
+        msg = (f"🔍 Archivos revisados: {len(paths)}\n"
+               f"🎬 Videos con archivos ocultos: {carriers}\n"
+               f"📁 Archivos ocultos: {len(records) - errors}")
+        if errors:
+            msg += f"\n⚠️ Trailers dañados: {errors}"
+        if report_path:
+            msg += f"\n💾 Reporte: {report_path}"
+        return True, msg, records
+    
+    def open_hidden_file(self, video_path: str,
+                         filename: Optional[str] = None) -> Tuple[dict, 'HiddenFileReader']:
+        """
+        Abre un archivo oculto como un objeto de solo lectura, sin escribirlo a disco.
+        El lector soporta read/readinto/seek y `memoryview()` para acceso sin copias;
+        si la entrada está comprimida se retorna un lector secuencial que descomprime al vuelo.
+        
+        Ejemplo:
+            metadata, reader = stegano.open_hidden_file("video.mp4")
+            with reader:
+                cabecera = reader.read(16)
+        
+        Args:
+            video_path: Ruta del video con archivos ocultos
+            filename: Entrada a abrir (obligatoria si el video contiene varios archivos)
+        
+        Returns:
+            Tuple[dict, HiddenFileReader]: (entrada de la tabla de contenidos, lector)
+        
+        Raises:
+            ValueError: si el video no contiene el archivo oculto pedido
+        """
+        f = open(video_path, 'rb')
+        try:
+            metadata, payload_offset = self._read_trailer(f, os.fstat(f.fileno()).st_size)
+            entry = self._find_entry(metadata, filename)
+        except Exception:
+            f.close()
+            raise
+        reader = HiddenFileReader(f, payload_offset + entry['offset'],
+                                  entry.get('stored_size', entry['filesize']))
+        if entry.get('compression'):
+            # Lectura secuencial descomprimiendo al vuelo (sin seek ni memoryview)
+            return entry, DecompressingReader(reader, self._decompressor(entry['compression']),
+                                              self.DECOMPRESS_READ_SIZE)
+        return entry, reader
+    
+    def _unique_output_path(self, output_dir: str, filename: str) -> str:
+        """Construye la ruta de salida sin sobrescribir archivos existentes."""
+        parts = Path(filename).parts
+        if not parts or Path(filename).is_absolute() or '..' in parts:
+            raise ValueError(f"Nombre de archivo no permitido: {filename}")
+        output_path = os.path.join(output_dir, *parts)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        
+        # Si el archivo ya existe, agregar número para no sobrescribir
+        base_name = Path(output_path).stem
+        extension = Path(output_path).suffix
+        parent = os.path.dirname(output_path)
+        counter = 1
+        while os.path.exists(output_path):
+            output_path = os.path.join(parent, f"{base_name}_{counter}{extension}")
+            counter += 1
+        return output_path
+    
+    def _sha256_stream(self, f, length: Optional[int] = None) -> str:
+        """SHA-256 de `length` bytes (o hasta el final) desde la posición actual de `f`."""
+        digest = hashlib.sha256()
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = len(buffer) if remaining is None else min(len(buffer), remaining)
+            n = f.readinto(view[:size])
+            if not n:
+                break
+            digest.update(view[:n])
+            if remaining is not None:
+                remaining -= n
+        return digest.hexdigest()
+    
+    def _sha256_file(self, path: str) -> str:
+        with open(path, 'rb') as f:
+            return self._sha256_stream(f)
+    
+    def _decompressor(self, codec: str):
+        if codec not in self.COMPRESSION_CODECS:
+            raise ValueError(f"Códec de compresión desconocido: {codec}")
+        return self.COMPRESSION_CODECS[codec][1]()
+    
+    def _decompress_range(self, f, f_out, offset: int, length: int, codec: str,
+                          progress=None) -> str:
+        """
+        Descomprime `length` bytes de `f` desde `offset` hacia `f_out` por bloques
+        y retorna el SHA-256 del contenido original (calculado en la misma pasada).
+        """
+        decompressor = self._decompressor(codec)
+        digest = hashlib.sha256()
+        buffer = bytearray(self.DECOMPRESS_READ_SIZE)
+        view = memoryview(buffer)
+        f.seek(offset)
+        remaining = length
+        written = 0
+        while remaining > 0:
+            n = f.readinto(view[:min(len(buffer), remaining)])
+            if not n:
+                raise ValueError("El archivo parece estar truncado.")
+            remaining -= n
+            # La salida se escribe por trozos acotados, sin materializar toda la expansión
+            for out in _decompress_bounded(decompressor, view[:n], self.DECOMPRESS_READ_SIZE,
+                                           final=remaining == 0):
+                f_out.write(out)
+                digest.update(out)
+                written += len(out)
+                if progress:
+                    progress(written)
+        return digest.hexdigest()
+    
+    def _extract_entries(self, f, payload_offset: int, entries: List[dict], output_dir: str,
+                         progress_callback=None, verify: bool = True) -> Tuple[List[str], str]:
+        """
+        Copia cada entrada desde su offset al directorio de salida por bloques
+        (copy_file_range/sendfile/mmap), o la descomprime al vuelo si está comprimida.
+        Con `verify`, los resúmenes por bloque se comprueban en un pool de hilos durante
+        la copia; las entradas antiguas sin ellos se verifican con su SHA-256.
+        
+        Returns:
+            Tuple[List[str], str]: (rutas extraídas, método de copia)
+        """
+        total_bytes = max(1, sum(entry['filesize'] for entry in entries))
+        done = 0
+        paths = []
+        copy_method = None
+        checker = _ChunkVerifier(f, self.VERIFY_WORKERS) if verify else None
+        try:
+            for entry in entries:
+                output_path = self._unique_output_path(output_dir, entry['filename'])
+                paths.append(output_path)
                 
-            # Añadir el payload al final del archivo copiado
-            with open(output_path, 'ab') as f_out:
-                f_out.write(payload)
+                def report(copied, base=done):
+                    if progress_callback:
+                        progress_callback(10 + int((base + copied) * 90 / total_bytes))
+                
+                # Los bloques se verifican en hilos mientras se copia la entrada
+                pending = checker.submit(payload_offset, entry) if checker else None
+                checksum = None
+                with open(output_path, 'wb') as f_out:
+                    if entry.get('compression'):
+                        checksum = self._decompress_range(f, f_out, payload_offset + entry['offset'],
+                                                          entry['stored_size'], entry['compression'],
+                                                          report)
+                        copy_method = entry['compression']
+                    else:
+                        copy_method = self._copy_range(f, f_out, payload_offset + entry['offset'],
+                                                       entry['filesize'], report)
+                done += entry['filesize']
+                
+                if pending is not None:
+                    checker.wait(pending, entry)
+                elif verify and entry.get('sha256'):
+                    # Archivos sin resúmenes por bloque: verificar el SHA-256 completo
+                    if checksum is None:
+                        checksum = self._sha256_file(output_path)
+                    if checksum != entry['sha256']:
+                        raise ValueError(f"La suma de verificación de '{entry['filename']}' no coincide.")
+        except Exception:
+            # No dejar archivos extraídos a medias
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            if checker:
+                checker.close()
+        return paths, copy_method
+    
+    def verify_hidden_files(self, video_path: str, progress_callback=None) -> Tuple[bool, str]:
+        """
+        Comprueba la integridad de los archivos ocultos sin extraerlos, verificando
+        los resúmenes por bloque en paralelo.
+        
+        Returns:
+            Tuple[bool, str]: (íntegro, mensaje)
+        """
+        try:
+            with open(video_path, 'rb') as f:
+                try:
+                    metadata, payload_offset = self._read_trailer(f, os.fstat(f.fileno()).st_size)
+                except ValueError as e:
+                    return False, str(e)
+                entries = self._entries_from_metadata(metadata)
                 
+                checker = _ChunkVerifier(f, self.VERIFY_WORKERS)
+                unchecked = []
+                try:
+                    pending = [(entry, checker.submit(payload_offset, entry)) for entry in entries]
+                    for i, (entry, futures) in enumerate(pending, 1):
+                        if futures is not None:
+                            checker.wait(futures, entry)
+                        elif entry.get('sha256') and not entry.get('compression'):
+                            # Archivos antiguos: verificar el SHA-256 completo del rango
+                            f.seek(payload_offset + entry['offset'])
+                            if self._sha256_stream(f, entry['filesize']) != entry['sha256']:
+                                raise ValueError(
+                                    f"La suma de verificación de '{entry['filename']}' no coincide."
+                                )
+                        else:
+                            unchecked.append(entry['filename'])
+                        if progress_callback:
+                            progress_callback(int(i * 100 / len(pending)))
+                finally:
+                    checker.close()
+        except ValueError as e:
+            return False, f"❌ {str(e)}"
+        except Exception as e:
+            return False, f"Error al verificar archivos: {str(e)}"
+        
+        msg = f"✅ {len(entries) - len(unchecked)} archivo(s) íntegros."
+        if unchecked:
+            msg += f"\n⚠️ Sin resúmenes de integridad: {', '.join(unchecked)}"
+        return True, msg
+    
+    def extract_hidden_entry(self, video_path: str, filename: str, output_dir: str,
+                             progress_callback=None, verify: bool = True) -> Tuple[bool, str, Optional[str]]:
+        """
+        Extrae una sola entrada de un video con varios archivos ocultos, saltando
+        directamente a su offset sin leer las demás.
+        
+        Args:
+            video_path: Ruta del video con archivos ocultos
+            filename: Nombre de la entrada (ver list_hidden_files)
+            output_dir: Directorio donde guardar el archivo extraído
+            progress_callback: Función callback para reportar progreso (0-100)
+            verify: Comprobar el SHA-256 de la entrada tras extraerla
+        
+        Returns:
+            Tuple[bool, str, Optional[str]]: (éxito, mensaje, ruta_archivo_extraído)
+        """
+        try:
+            with open(video_path, 'rb') as f:
+                try:
+                    metadata, payload_offset = self._read_trailer(f, os.fstat(f.fileno()).st_size)
+                    entry = self._find_entry(metadata, filename)
+                except ValueError as e:
+                    return False, str(e), None
+                
+                if progress_callback:
+                    progress_callback(10)
+                paths, copy_method = self._extract_entries(
+                    f, payload_offset, [entry], output_dir, progress_callback, verify
+                )
+            
             if progress_callback:
                 progress_callback(100)
             
             success_msg = (
-                f"✅ ¡Archivo ocultado exitosamente (EOF)!\n\n"
-                f"📁 Archivo: {metadata['filename']}\n"
-                f"📦 Tamaño: {len(file_data) / 1024:.2f} KB\n"
-                f"💾 Video guardado en: {output_path}\n\n"
-                f"⚠️ ADVERTENCIA: No conviertas ni comprimas este video, o perderás el archivo."
+                f"✅ ¡Archivo extraído exitosamente!\n\n"
+                f"📁 Archivo: {entry['filename']}\n"
+                f"📦 Tamaño: {entry['filesize'] / 1024:.2f} KB\n"
+                f"💾 Guardado en: {paths[0]}\n"
+                f"⚙️ Copia: {copy_method}"
             )
-            
-            return True, success_msg
-            
+            return True, success_msg, paths[0]
+        
         except Exception as e:
-            return False, f"Error al ocultar archivo: {str(e)}"
+            return False, f"Error al extraer archivo: {str(e)}", None
     
     def extract_file_from_video(self, video_path: str, output_dir: str, 
                                progress_callback=None) -> Tuple[bool, str, Optional[str]]:
         """
-        Extrae un archivo oculto del final de un video (EOF).
+        Extrae el archivo oculto del final de un video (EOF).
+        El contenido se copia directamente del video al destino por bloques
+        (copy_file_range/sendfile/mmap), con memoria constante. Si el video
+        contiene varios archivos, se extraen todos.
         
         Args:
             video_path: Ruta del video con archivo oculto
             output_dir: Directorio donde guardar el archivo extraído
-            progress_callback: Función callback para reportar progreso
+            progress_callback: Función callback para reportar progreso (0-100)
         
         Returns:
-            Tuple[bool, str, Optional[str]]: (éxito, mensaje, ruta_archivo_extraído)
+            Tuple[bool, str, Optional[str]]: (éxito, mensaje, ruta_archivo_extraído);
+            con varios archivos la ruta es la del directorio de salida
         """
         try:
             if progress_callback:
-                progress_callback(10)
+                progress_callback(5)
                 
             file_size = os.path.getsize(video_path)
             
             with open(video_path, 'rb') as f:
-                # 1. Buscar el MAGIC_MARKER al final del archivo
-                marker_len = len(self.MAGIC_MARKER)
-                f.seek(-marker_len, 2) # Ir al final menos la longitud del marcador
-                read_marker = f.read(marker_len)
-                
-                if read_marker != self.MAGIC_MARKER:
-                     return False, "No se encontró el marcador de archivo oculto (EOF) en este video.", None
-                
-                if progress_callback:
-                    progress_callback(30)
-                
-                # 2. Leer la longitud de la metadata
-                # La estructura es: ... + Metadata + MetadataLength(4) + MAGIC_MARKER
-                # Entonces debemos retroceder: MarkerLen + 4 bytes
-                
-                seek_offset = marker_len + 4
-                if file_size < seek_offset:
-                    return False, "Archivo corrupto o demasiado pequeño.", None
-                    
-                f.seek(-seek_offset, 2)
-                metadata_len_bytes = f.read(4)
-                metadata_len = int.from_bytes(metadata_len_bytes, byteorder='big')
-                
-                if progress_callback:
-                    progress_callback(50)
-                
-                # 3. Leer la metadata
-                # Retroceder: MarkerLen + 4 + MetadataLen
-                seek_offset += metadata_len
-                if file_size < seek_offset:
-                    return False, "Metadata corrupta.", None
-                
-                f.seek(-seek_offset, 2)
-                metadata_bytes = f.read(metadata_len)
                 try:
-                    metadata = json.loads(metadata_bytes.decode('utf-8'))
-                except json.JSONDecodeError:
-                    return False, "Error al decodificar la metadata.", None
-                
-                filename = metadata.get('filename', 'extracted_file')
-                hidden_file_size = metadata.get('filesize', 0)
-                
-                if hidden_file_size <= 0:
-                     return False, "Tamaño de archivo inválido en metadata.", None
-
-                if progress_callback:
-                    progress_callback(70)
-
-                # 4. Leer el archivo oculto
-                # Retroceder: MarkerLen + 4 + MetadataLen + FileSize
-                seek_offset += hidden_file_size
-                if file_size < seek_offset:
-                     return False, "El archivo parece estar truncado.", None
-                
-                f.seek(-seek_offset, 2)
-                file_data = f.read(hidden_file_size)
-                
-                # Guardar el archivo extraído
-                output_path = os.path.join(output_dir, filename)
-                
-                # Si el archivo ya existe, agregar número para no sobrescribir
-                base_name = Path(filename).stem
-                extension = Path(filename).suffix
-                counter = 1
-                while os.path.exists(output_path):
-                    output_path = os.path.join(output_dir, f"{base_name}_{counter}{extension}")
-                    counter += 1
+                    metadata, payload_offset = self._read_trailer(f, file_size)
+                except ValueError as e:
+                    return False, str(e), None
+                entries = self._entries_from_metadata(metadata)
                 
                 if progress_callback:
-                    progress_callback(90)
-                    
-                with open(output_path, 'wb') as f_out:
-                    f_out.write(file_data)
-                
-                if progress_callback:
-                    progress_callback(100)
+                    progress_callback(10)
                 
+                paths, copy_method = self._extract_entries(
+                    f, payload_offset, entries, output_dir, progress_callback
+                )
+            
+            if progress_callback:
+                progress_callback(100)
+            
+            if len(entries) == 1:
                 success_msg = (
                     f"✅ ¡Archivo extraído exitosamente!\n\n"
-                    f"📁 Archivo: {filename}\n"
-                    f"📦 Tamaño: {hidden_file_size / 1024:.2f} KB\n"
-                    f"💾 Guardado en: {output_path}"
+                    f"📁 Archivo: {entries[0]['filename']}\n"
+                    f"📦 Tamaño: {entries[0]['filesize'] / 1024:.2f} KB\n"
+                    f"💾 Guardado en: {paths[0]}\n"
+                    f"⚙️ Copia: {copy_method}"
                 )
-                
-                return True, success_msg, output_path
+                return True, success_msg, paths[0]
+            
+            success_msg = (
+                f"✅ ¡Archivos extraídos exitosamente!\n\n"
+                f"📁 Archivos: {len(entries)}\n"
+                f"📦 Tamaño total: {metadata['filesize'] / 1024:.2f} KB\n"
+                f"💾 Guardados en: {output_dir}\n"
+                f"⚙️ Copia: {copy_method}"
+            )
+            return True, success_msg, output_dir
 
         except Exception as e:
             return False, f"Error al extraer archivo: {str(e)}", None
@@ -349,3 +1304,241 @@ class FileStegano:
             text += f"• {category.upper()}: {', '.join(extensions)}\n"
         text += "\n💡 En modo EOF, prácticamente cualquier archivo binario es soportado."
         return text
+
+
+def _chunk_hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _decompress_bounded(decompressor, data, max_length: int, final: bool = False):
+    """
+    Genera la salida de `decompressor` para `data` en trozos de a lo sumo `max_length`
+    bytes, continuando con unconsumed_tail (zlib) o mientras no pida más entrada (lzma).
+    Los descompresores sin ninguno de los dos se llaman una sola vez, sin límite.
+    Con `final`, añade al final la salida de flush() si el descompresor lo tiene.
+    """
+    if not data and getattr(decompressor, 'eof', False):
+        pass  # Flujo ya terminado (lzma no admite más llamadas)
+    elif not hasattr(decompressor, 'unconsumed_tail') and not hasattr(decompressor, 'needs_input'):
+        yield decompressor.decompress(data)
+    else:
+        while True:
+            out = decompressor.decompress(data, max_length)
+            if hasattr(decompressor, 'unconsumed_tail'):
+                data = decompressor.unconsumed_tail
+                more = bool(data)
+            else:
+                data = b''
+                more = not decompressor.needs_input and not decompressor.eof
+            if out:
+                yield out
+            if not more:
+                break
+    if final and hasattr(decompressor, 'flush'):
+        yield decompressor.flush()
+
+
+class _ChunkDigests:
+    """Acumula resúmenes BLAKE2b de bloques de tamaño fijo sobre un flujo de bytes."""
+    
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.digests = []
+        self._hash = _chunk_hasher()
+        self._filled = 0
+    
+    def update(self, data):
+        view = memoryview(data).cast('B')
+        while view:
+            take = min(len(view), self.chunk_size - self._filled)
+            self._hash.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == self.chunk_size:
+                self.digests.append(self._hash.hexdigest())
+                self._hash = _chunk_hasher()
+                self._filled = 0
+    
+    def finish(self) -> List[str]:
+        if self._filled:
+            self.digests.append(self._hash.hexdigest())
+            self._hash = _chunk_hasher()
+            self._filled = 0
+        return self.digests
+
+
+class _ChunkVerifier:
+    """
+    Verifica los resúmenes por bloque de las entradas en un pool de hilos,
+    leyendo los bytes guardados directamente de una vista mmap del video
+    (hashlib libera el GIL, así que los bloques se procesan en paralelo).
+    """
+    
+    def __init__(self, f, workers: int):
+        self._f = f
+        self._workers = workers
+        self._pool = None
+        self._mmap = None
+        self._view = None
+    
+    def submit(self, payload_offset: int, entry: dict):
+        """Lanza la verificación de la entrada; retorna None si no tiene resúmenes por bloque."""
+        digests = entry.get('chunk_digests')
+        if not digests or entry.get('chunk_hash') != FileStegano.CHUNK_HASH:
+            return None
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers)
+            self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        
+        start = payload_offset + entry['offset']
+        end = start + entry.get('stored_size', entry['filesize'])
+        chunk_size = entry['chunk_size']
+        if len(digests) != -(-(end - start) // chunk_size):
+            raise ValueError(f"Resúmenes de integridad inválidos para '{entry['filename']}'.")
+        return [
+            self._pool.submit(self._check, start + i * chunk_size,
+                              min(start + (i + 1) * chunk_size, end), expected)
+            for i, expected in enumerate(digests)
+        ]
+    
+    def _check(self, start: int, end: int, expected: str) -> bool:
+        with self._view[start:end] as chunk:
+            digest = _chunk_hasher()
+            digest.update(chunk)
+            return digest.hexdigest() == expected
+    
+    def wait(self, futures, entry: dict):
+        """Espera la verificación y lanza ValueError indicando el primer bloque dañado."""
+        for i, future in enumerate(futures):
+            if not future.result():
+                raise ValueError(
+                    f"La suma de verificación de '{entry['filename']}' no coincide "
+                    f"(bloque {i} dañado)."
+                )
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._view.release()
+            self._mmap.close()
+            self._pool = None
+
+
+class HiddenFileReader(io.RawIOBase):
+    """
+    Vista de solo lectura sobre el archivo oculto dentro del video.
+    Lee directamente del rango del video sin extraerlo a disco.
+    """
+    
+    def __init__(self, f, offset: int, length: int):
+        super().__init__()
+        self._f = f
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+        self._mmap = None
+        self._views = []
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("El lector está cerrado")
+        count = min(len(b), self._length - self._pos)
+        if count <= 0:
+            return 0
+        self._f.seek(self._offset + self._pos)
+        n = self._f.readinto(memoryview(b)[:count])
+        self._pos += n
+        return n
+    
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._length
+        if pos < 0:
+            raise ValueError("Posición negativa")
+        self._pos = pos
+        return pos
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def memoryview(self) -> memoryview:
+        """
+        Retorna una memoryview de solo lectura del archivo oculto respaldada por mmap.
+        Liberarla (`view.release()`) antes de cerrar el lector.
+        """
+        if self.closed:
+            raise ValueError("El lector está cerrado")
+        if self._mmap is None:
+            self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)[self._offset:self._offset + self._length]
+        self._views.append(view)
+        return view
+    
+    def close(self):
+        if self.closed:
+            return
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._f.close()
+        super().close()
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Lector secuencial que descomprime al vuelo una entrada comprimida.
+    No soporta seek; la memoria usada está acotada por el tamaño de lectura.
+    """
+    
+    def __init__(self, raw: HiddenFileReader, decompressor, read_size: int):
+        super().__init__()
+        self._raw = raw
+        self._decompressor = decompressor
+        self._read_size = read_size
+        self._pieces = iter(())  # Salida acotada pendiente del último bloque leído
+        self._pending = b''
+        self._pending_pos = 0
+        self._eof = False
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("El lector está cerrado")
+        while self._pending_pos >= len(self._pending):
+            piece = next(self._pieces, None)
+            if piece is None:
+                if self._eof:
+                    return 0
+                chunk = self._raw.read(self._read_size)
+                self._eof = not chunk
+                self._pieces = _decompress_bounded(self._decompressor, chunk, self._read_size,
+                                                   final=self._eof)
+                continue
+            self._pending = piece
+            self._pending_pos = 0
+        n = min(len(b), len(self._pending) - self._pending_pos)
+        memoryview(b)[:n] = memoryview(self._pending)[self._pending_pos:self._pending_pos + n]
+        self._pending_pos += n
+        return n
+    
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
@@ -5,12 +5,20 @@ Módulo para ocultar mensajes de texto en los frames de videos usando esteganogr
 import cv2
 import numpy as np
 import os
-from typing import Tuple
+from typing import Tuple, Optional
 from pathlib import Path
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 import hashlib
+import itertools
 import base64
+import struct
+import queue
 import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+from core.media_probe import _USE_SHELL, probe_media
 
 class FrameStegano:
     """Clase para manejar la esteganografía de texto en frames de video con cifrado."""
@@ -18,6 +26,45 @@ class FrameStegano:
     # Marcadores para delimitar el mensaje
     MAGIC_MARKER = "STEG_START"
     MAGIC_END = "STEG_END"
+    # Marcador de contenido binario cifrado por bloques (misma longitud que MAGIC_MARKER)
+    STREAM_MARKER = "STEG_CHUNK"
+    STREAM_CHUNK_SIZE = 64 * 1024
+    MAX_STREAM_CHUNK_SIZE = 64 * 1024 * 1024  # Cota del búfer por bloque al extraer
+    # Índice en el frame 0 cuando el contenido empieza más adelante en el video:
+    # marcador + frame inicial, nº de frames, bits por frame, bits por canal y máscara
+    INDEX_MARKER = "STEG_INDEX"
+    INDEX_FORMAT = '>IIQBB'
+    
+    # Derivación de clave: salt aleatorio por contenido guardado junto a las iteraciones.
+    # Los videos antiguos (sin la marca MODE_FLAG_KDF) usan el salt fijo original.
+    LEGACY_SALT = b'steg_salt_2024'
+    DEFAULT_KDF_ITERATIONS = 100000
+    MAX_KDF_ITERATIONS = 10000000
+    KDF_PARAMS_FORMAT = '>16sI'
+    MODE_FLAG_KDF = 0x08
+    KEY_CACHE_SIZE = 64
+    
+    # Caché LRU de claves derivadas compartida por todas las instancias,
+    # indexada por (hash de la contraseña, salt, iteraciones)
+    _key_cache = OrderedDict()
+    _key_cache_lock = threading.Lock()
+    
+    # Códecs y formatos de píxel que conservan exactamente los LSB (modo parcial)
+    PARTIAL_LOSSLESS_CODECS = ('ffv1', 'huffyuv', 'ffvhuff', 'utvideo')
+    PARTIAL_RGB_PIX_FMTS = ('bgr0', 'bgra', 'bgr24', 'rgb24', 'rgb0', 'rgba', '0rgb', 'gbrp')
+    
+    # Códec sin pérdida usado por el backend de pipes de FFmpeg
+    PIPE_VIDEO_CODEC = 'ffv1'
+    PIPE_PIX_FMT = 'bgr0'
+    PIPE_CONTAINERS = ('.avi', '.mkv')  # Contenedores que admiten FFV1/bgr0
+    
+    # Densidad LSB: bits por canal (1-4) y canales usados (subconjunto de B/G/R)
+    CHANNEL_INDEX = {'B': 0, 'G': 1, 'R': 2}
+    MAX_BITS_PER_CHANNEL = 4
+    DEFAULT_BITS_PER_CHANNEL = 1
+    DEFAULT_CHANNELS = 'B'
+    # Modos mostrados en el reporte de capacidad
+    CAPACITY_MODES = [(bits, channels) for bits in range(1, 5) for channels in ('B', 'BG', 'BGR')]
     
     def __init__(self):
         self.temp_dir = Path("temp")
@@ -25,83 +72,207 @@ class FrameStegano:
         self.temp_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
     
-    def _derive_key(self, password: str) -> bytes:
+    def _derive_key(self, password: str, salt: bytes = LEGACY_SALT,
+                    iterations: int = DEFAULT_KDF_ITERATIONS) -> bytes:
         """
         Deriva una clave segura a partir de una contraseña.
-        Usa PBKDF2 con SHA256.
+        Usa PBKDF2 con SHA256. El resultado se cachea (LRU) para no repetir la
+        derivación en lotes que usan la misma clave y salt.
         """
-        salt = b'steg_salt_2024'  # Salt fijo para este proyecto
-        key = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 100000)
+        cache_key = (hashlib.sha256(password.encode()).digest(), salt, iterations)
+        with self._key_cache_lock:
+            if cache_key in self._key_cache:
+                self._key_cache.move_to_end(cache_key)
+                return self._key_cache[cache_key]
+        
+        key = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
         # Fernet requiere una clave base64 de 32 bytes
-        return base64.urlsafe_b64encode(key[:32])
+        fernet_key = base64.urlsafe_b64encode(key[:32])
+        
+        with self._key_cache_lock:
+            self._key_cache[cache_key] = fernet_key
+            while len(self._key_cache) > self.KEY_CACHE_SIZE:
+                self._key_cache.popitem(last=False)
+        return fernet_key
+    
+    def _new_kdf_params(self, iterations: int) -> Tuple[bytes, int]:
+        """Genera un salt aleatorio para un contenido nuevo y valida las iteraciones."""
+        if not 1 <= iterations <= self.MAX_KDF_ITERATIONS:
+            raise ValueError(f"Las iteraciones deben estar entre 1 y {self.MAX_KDF_ITERATIONS}")
+        return os.urandom(16), iterations
     
-    def _encrypt_message(self, message: str, password: str) -> bytes:
+    def _parse_kdf_params(self, data: bytes) -> Tuple[bytes, int]:
+        """Lee salt e iteraciones guardados junto al contenido."""
+        salt, iterations = struct.unpack(self.KDF_PARAMS_FORMAT, data)
+        if not 1 <= iterations <= self.MAX_KDF_ITERATIONS:
+            raise ValueError("Parámetros de derivación de clave inválidos")
+        return salt, iterations
+    
+    def _encrypt_message(self, message: str, password: str, salt: bytes = LEGACY_SALT,
+                         iterations: int = DEFAULT_KDF_ITERATIONS) -> bytes:
         """Cifra un mensaje usando Fernet con la contraseña."""
         try:
-            key = self._derive_key(password)
+            key = self._derive_key(password, salt, iterations)
             cipher = Fernet(key)
             encrypted = cipher.encrypt(message.encode())
             return encrypted
         except Exception as e:
             raise Exception(f"Error al cifrar mensaje: {str(e)}")
     
-    def _decrypt_message(self, encrypted_data: bytes, password: str) -> str:
+    def _decrypt_message(self, encrypted_data: bytes, password: str, salt: bytes = LEGACY_SALT,
+                         iterations: int = DEFAULT_KDF_ITERATIONS) -> str:
         """Descifra un mensaje usando Fernet con la contraseña."""
         try:
-            key = self._derive_key(password)
+            key = self._derive_key(password, salt, iterations)
             cipher = Fernet(key)
             decrypted = cipher.decrypt(encrypted_data)
             return decrypted.decode()
         except Exception as e:
             raise Exception(f"Error al descifrar mensaje: {str(e)}")
     
-    def _to_bin(self, data):
-        """Convierte datos (string o bytes) a formato binario."""
+    def _to_bits(self, data) -> np.ndarray:
+        """Convierte datos (string o bytes) a un arreglo uint8 de bits (MSB primero)."""
         if isinstance(data, str):
-            return ''.join([format(ord(i), "08b") for i in data])
-        elif isinstance(data, bytes):
-            return ''.join([format(i, "08b") for i in data])
+            data = data.encode('latin-1')
         elif isinstance(data, int):
-            return format(data, "08b")
-        else:
+            data = bytes([data])
+        elif not isinstance(data, (bytes, bytearray)):
             raise TypeError("Tipo no soportado")
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
 
-    def _bin_to_str(self, binary):
-        """Convierte binario a string."""
-        data = [binary[i:i+8] for i in range(0, len(binary), 8)]
-        return "".join([chr(int(d, 2)) for d in data if d])
+    def _from_bits(self, bits: np.ndarray) -> bytes:
+        """Empaqueta un arreglo de bits (0/1) en bytes, ignorando bits sobrantes."""
+        usable = (len(bits) // 8) * 8
+        return np.packbits(bits[:usable].astype(np.uint8, copy=False)).tobytes()
 
-    def calculate_text_capacity(self, video_path: str) -> Tuple[int, dict]:
-        """Calcula capacidad aproximada considerando el cifrado."""
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError("No se pudo abrir el video")
+    def _parse_layout(self, bits_per_channel: int, channels: str) -> Tuple[int, Tuple[int, ...]]:
+        """Valida la densidad pedida y retorna (bits_por_canal, índices de canal en orden B, G, R)."""
+        if not 1 <= bits_per_channel <= self.MAX_BITS_PER_CHANNEL:
+            raise ValueError(f"Bits por canal deben estar entre 1 y {self.MAX_BITS_PER_CHANNEL}")
+        channels = channels.upper()
+        if not channels or any(c not in self.CHANNEL_INDEX for c in channels):
+            raise ValueError("Los canales deben ser un subconjunto de 'BGR'")
+        return bits_per_channel, tuple(sorted({self.CHANNEL_INDEX[c] for c in channels}))
+
+    def _layout_from_mode_bytes(self, bits_per_channel: int, mask: int) -> Tuple[int, Tuple[int, ...]]:
+        """Reconstruye la densidad a partir de los bytes de modo (ignora las marcas extra)."""
+        channels = tuple(i for i in range(3) if mask & (1 << i))
+        if not 1 <= bits_per_channel <= self.MAX_BITS_PER_CHANNEL or not channels:
+            raise ValueError("Modo de densidad inválido en la cabecera")
+        return bits_per_channel, channels
+
+    def _header_bytes(self, length: int, layout: Tuple[int, Tuple[int, ...]],
+                      marker: str = MAGIC_MARKER, flags: int = 0) -> bytes:
+        """
+        Cabecera escrita siempre con 1 LSB del canal azul desde el píxel 0:
+        marcador + [bits_por_canal, máscara_de_canales | flags] + longitud (16 dígitos).
+        Para texto en el modo por defecto y sin flags se omiten los bytes de modo
+        (formato original).
+        """
+        bits_per_channel, channels = layout
+        mode = b''
+        if (marker != self.MAGIC_MARKER or flags
+                or layout != self._parse_layout(self.DEFAULT_BITS_PER_CHANNEL, self.DEFAULT_CHANNELS)):
+            mask = sum(1 << c for c in channels) | flags
+            mode = bytes([bits_per_channel, mask])
+        return marker.encode() + mode + f"{length:016d}".encode()
+
+    def _index_builder(self, start_frame: int, writer: '_LSBWriter'):
+        """
+        Retorna la función que genera los bits del índice del frame 0 una vez
+        conocido el número de píxeles por frame (nº de frames 0 si es desconocido).
+        """
+        def build(pixels_per_frame: int) -> np.ndarray:
+            try:
+                frame_count = writer.frames_needed(pixels_per_frame) - start_frame
+            except ValueError:
+                frame_count = 0
+            mask = sum(1 << c for c in writer.channels)
+            fields = struct.pack(self.INDEX_FORMAT, start_frame, frame_count,
+                                 pixels_per_frame * writer.bits_per_pixel,
+                                 writer.bits_per_channel, mask)
+            return self._to_bits(self.INDEX_MARKER.encode() + fields)
+        return build
+
+    def _payload_reader(self, cap) -> '_LSBReader':
+        """
+        Crea el lector posicionado al inicio del contenido. Si el frame 0 lleva un
+        índice, salta directamente al frame inicial (CAP_PROP_POS_FRAMES) sin
+        decodificar los intermedios; si no, el contenido empieza en el frame 0.
+        """
+        reader = _LSBReader(cap)
+        marker_bits = np.empty(len(self.INDEX_MARKER) * 8, dtype=np.uint8)
+        if not reader.read_into(marker_bits):
+            return reader
+        if self._from_bits(marker_bits) != self.INDEX_MARKER.encode():
+            # No hay índice: devolver los bits leídos para que los lea la cabecera
+            reader.carry = marker_bits
+            return reader
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        cap.release()
+        field_bits = np.empty(struct.calcsize(self.INDEX_FORMAT) * 8, dtype=np.uint8)
+        if not reader.read_into(field_bits):
+            raise ValueError("Índice de contenido incompleto")
+        start_frame, frame_count, _, _, _ = struct.unpack(self.INDEX_FORMAT, self._from_bits(field_bits))
         
-        # Usamos 1 bit por píxel (solo canal Azul) en el 80% de los frames
-        pixels_per_frame = width * height
-        usable_frames = max(1, int(total_frames * 0.8)) 
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:
+            # El contenedor no permite buscar: avanzar decodificando
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            for _ in range(start_frame):
+                if not cap.grab():
+                    raise ValueError("El video es más corto que el índice de contenido")
+        reader = _LSBReader(cap)
+        reader.frame_limit = frame_count or None
+        return reader
+
+    def _max_message_chars(self, capacity_bytes: int) -> int:
+        """Máximo de bytes de texto cuyo token Fernet (más MAGIC_END) cabe en capacity_bytes."""
+        # Token Fernet = base64(1 + 8 + 16 + 16 * (n // 16 + 1) + 32)
+        available = capacity_bytes - len(self.MAGIC_END)
+        raw_max = (available // 4) * 3
+        blocks = (raw_max - 57) // 16
+        return max(0, blocks * 16 - 1)
+
+    def calculate_text_capacity(self, video_path: str, bits_per_channel: int = DEFAULT_BITS_PER_CHANNEL,
+                                channels: str = DEFAULT_CHANNELS) -> Tuple[int, dict]:
+        """
+        Calcula la capacidad (en caracteres) para la densidad indicada, considerando
+        la cabecera y el tamaño del token cifrado. En info['capacity_by_mode'] se
+        incluye la capacidad de cada modo de CAPACITY_MODES.
+        """
+        layout = self._parse_layout(bits_per_channel, channels)
         
-        # Capacidad total en bits
-        total_bits = pixels_per_frame * usable_frames
+        video_info = probe_media(video_path)
+        total_frames = video_info['total_frames']
+        width = video_info['width']
+        height = video_info['height']
+        fps = video_info['fps']
         
-        # El mensaje cifrado con Fernet es ~30% más largo que el original
-        # Convertir a caracteres (8 bits por char)
-        capacity_chars = (total_bits // 8) // 1.5
+        total_pixels = width * height * total_frames
+        
+        def chars_for(mode_layout):
+            n_bits, mode_channels = mode_layout
+            header_pixels = len(self._header_bytes(0, mode_layout, flags=self.MODE_FLAG_KDF)) * 8
+            payload_bits = max(0, total_pixels - header_pixels) * n_bits * len(mode_channels)
+            return self._max_message_chars(payload_bits // 8 - struct.calcsize(self.KDF_PARAMS_FORMAT))
+        
+        capacity_chars = chars_for(layout)
+        capacity_by_mode = {
+            f"{n_bits}bit-{mode_channels}": chars_for(self._parse_layout(n_bits, mode_channels))
+            for n_bits, mode_channels in self.CAPACITY_MODES
+        }
         
         info = {
             'total_frames': total_frames,
             'width': width,
             'height': height,
             'fps': fps,
-            'capacity_chars': int(capacity_chars)
+            'bits_per_channel': layout[0],
+            'channels': channels.upper(),
+            'capacity_chars': capacity_chars,
+            'capacity_by_mode': capacity_by_mode
         }
-        return int(capacity_chars), info
+        return capacity_chars, info
     
     
     def _extract_audio_from_video(self, video_path: str) -> str:
@@ -148,281 +319,1101 @@ class FrameStegano:
         except Exception as e:
             return False
 
-    def hide_text_in_video(self, video_path: str, text: str, password: str, output_path: str, 
-                          progress_callback=None) -> Tuple[bool, str]:
-        """Oculta texto cifrado en los frames usando LSB."""
-        try:
-            # 1. Cifrar el mensaje
-            encrypted_message = self._encrypt_message(text, password)
-            
-            # 2. Preparar el mensaje para incrustar
-            full_msg = f"{self.MAGIC_MARKER}{len(encrypted_message):016d}"
-            full_msg_bin = self._to_bin(full_msg)
-            encrypted_bin = self._to_bin(encrypted_message)
-            end_marker_bin = self._to_bin(self.MAGIC_END)
+    def _run_frame_pipeline(self, read_frame, process_frame, write_frame,
+                            queue_depth: int = 0) -> dict:
+        """
+        Ejecuta las etapas decodificar -> incrustar -> codificar sobre todos los frames.
+        
+        Con queue_depth > 0 cada etapa corre en su propio hilo, unidas por colas acotadas
+        (OpenCV y FFmpeg liberan el GIL), de modo que el tiempo total tiende al de la etapa
+        más lenta. Con queue_depth == 0 se ejecutan en secuencia en el hilo actual.
+        `read_frame` retorna None al terminar.
+        
+        Returns:
+            dict: frames procesados, tiempo total y frames/s de cada etapa
+        """
+        stages = {'decode': read_frame, 'embed': process_frame, 'encode': write_frame}
+        busy = {name: 0.0 for name in stages}
+        frames = 0
+        start = time.perf_counter()
+        
+        def timed(name, arg=None):
+            t0 = time.perf_counter()
+            result = stages[name]() if arg is None else stages[name](arg)
+            busy[name] += time.perf_counter() - t0
+            return result
+        
+        if queue_depth <= 0:
+            while True:
+                frame = timed('decode')
+                if frame is None:
+                    break
+                timed('encode', timed('embed', frame))
+                frames += 1
+        else:
+            to_embed = queue.Queue(maxsize=queue_depth)
+            to_encode = queue.Queue(maxsize=queue_depth)
+            stop = threading.Event()
+            errors = []
             
-            bits = full_msg_bin + encrypted_bin + end_marker_bin
-            total_bits = len(bits)
-            bit_idx = 0
+            def put(q, item):
+                # Evita bloquear para siempre si otra etapa falló
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        return
+                    except queue.Full:
+                        continue
             
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return False, "No se pudo abrir el video"
-                
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Crear archivo temporal sin audio
-            temp_video_path = str(self.temp_dir / f"temp_no_audio_{Path(output_path).name}")
-            
-            # Lista de códecs en orden de preferencia
-            codec_options = [
-                ('FFV1', '.avi'),
-                ('XVID', '.avi'),
-                ('MJPG', '.avi'),
-            ]
+            def get(q):
+                while not stop.is_set():
+                    try:
+                        return q.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                return None
             
-            fourcc = None
-            video_created = False
-            codec_name = None
+            def decoder():
+                try:
+                    while not stop.is_set():
+                        frame = timed('decode')
+                        put(to_embed, frame)
+                        if frame is None:
+                            break
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
             
-            # Intentar con cada códec hasta que uno funcione
-            for codec_name, recommended_ext in codec_options:
+            def embedder():
                 try:
-                    fourcc = cv2.VideoWriter_fourcc(*codec_name)
-                    output_test = temp_video_path
-                    if not temp_video_path.lower().endswith(recommended_ext):
-                        output_test = str(Path(temp_video_path).with_suffix(recommended_ext))
-                    
-                    out = cv2.VideoWriter(output_test, fourcc, fps, (width, height))
-                    
-                    if out.isOpened():
-                        temp_video_path = output_test
-                        video_created = True
-                        break
-                    else:
-                        out.release()
+                    while True:
+                        frame = get(to_embed)
+                        if frame is None:
+                            break
+                        put(to_encode, timed('embed', frame))
+                    put(to_encode, None)
                 except Exception as e:
+                    errors.append(e)
+                    stop.set()
+            
+            threads = [threading.Thread(target=decoder, daemon=True),
+                       threading.Thread(target=embedder, daemon=True)]
+            for t in threads:
+                t.start()
+            
+            # La codificación corre en el hilo actual
+            try:
+                while True:
+                    frame = get(to_encode)
+                    if frame is None:
+                        break
+                    timed('encode', frame)
+                    frames += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                stop.set()
+                for t in threads:
+                    t.join()
+            
+            if errors:
+                raise errors[0]
+        
+        elapsed = time.perf_counter() - start
+        stats = {'frames': frames, 'elapsed_seconds': elapsed}
+        for name, seconds in busy.items():
+            stats[f'{name}_fps'] = frames / seconds if seconds > 0 else 0.0
+        return stats
+
+    def _format_pipeline_stats(self, stats: dict) -> str:
+        """Texto con el rendimiento por etapa del pipeline."""
+        return (
+            f"\nRendimiento: decodificación {stats['decode_fps']:.1f} fps, "
+            f"incrustación {stats['embed_fps']:.1f} fps, "
+            f"codificación {stats['encode_fps']:.1f} fps"
+        )
+
+    def _find_keyframe_at_or_after(self, video_path: str, frame_index: int) -> Optional[Tuple[int, float]]:
+        """
+        Busca el primer keyframe cuyo índice sea >= frame_index.
+        Solo lee cabeceras de paquetes (sin decodificar). Retorna (índice, pts_time).
+        """
+        cmd = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+        ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, shell=_USE_SHELL)
+        try:
+            for idx, line in enumerate(proc.stdout):
+                if idx < frame_index:
                     continue
+                pts_time, _, flags = line.strip().partition(',')
+                if 'K' in flags and pts_time not in ('', 'N/A'):
+                    return idx, float(pts_time)
+            return None
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def _hide_bits_partial(self, video_path: str, writer: '_LSBWriter', output_path: str,
+                           progress_callback=None) -> Tuple[bool, str]:
+        """
+        Reescribe solo el segmento inicial que contiene el mensaje y copia el resto
+        del video tal cual (stream copy), uniendo ambos con el demuxer concat de FFmpeg.
+        
+        Requiere que el video fuente use un códec sin pérdida RGB (p. ej. FFV1), para que
+        el segmento reescrito pueda concatenarse sin recodificar el resto.
+        """
+        try:
+            stream = probe_media(video_path, detailed=True)
+        except ValueError:
+            return False, "No se pudo analizar el video con ffprobe."
+        if (stream['video_codec'] not in self.PARTIAL_LOSSLESS_CODECS
+                or stream['pix_fmt'] not in self.PARTIAL_RGB_PIX_FMTS):
+            return False, (
+                f"El modo parcial requiere un video sin pérdida RGB "
+                f"(actual: {stream['video_codec']}/{stream['pix_fmt']})."
+            )
+        
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return False, "No se pudo abrir el video"
+        
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        frames_needed = writer.frames_needed(width * height)
+        
+        # El corte debe caer en un keyframe para poder copiar el resto sin recodificar
+        split = self._find_keyframe_at_or_after(video_path, frames_needed)
+        split_frame, split_time = split if split else (None, None)
+        
+        name = Path(output_path).stem
+        head_path = self.temp_dir / f"temp_head_{name}.avi"
+        tail_path = self.temp_dir / f"temp_tail_{name}.avi"
+        list_path = self.temp_dir / f"temp_concat_{name}.txt"
+        
+        try:
+            # 1. Reescribir el segmento inicial con el mensaje
+            encoder_cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+                '-r', f'{fps}', '-i', '-',
+                '-c:v', stream['video_codec'], '-pix_fmt', stream['pix_fmt'],
+                str(head_path)
+            ]
+            encoder = subprocess.Popen(encoder_cmd, stdin=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, shell=_USE_SHELL)
             
-            if not video_created:
+            frames_written = 0
+            head_frames = split_frame if split_frame is not None else total_frames
+            try:
+                while frames_written < head_frames:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if not writer.done:
+                        writer.embed(frame)
+                    encoder.stdin.write(frame.tobytes())
+                    frames_written += 1
+                    
+                    if progress_callback and frames_written % 10 == 0:
+                        progress_callback(int(frames_written / max(head_frames, 1) * 80))
+            finally:
                 cap.release()
-                return False, (
-                    "No se pudo crear el video de salida.\n\n"
-                    "Posibles soluciones:\n"
-                    "1. Usa la extensión .avi en lugar de .mp4\n"
-                    "2. Instala ffmpeg en el sistema\n"
-                    "3. Verifica que el directorio de salida sea escribible"
-                )
+                encoder.stdin.close()
+                encoder.wait()
             
-            frame_count = 0
-            finished = False
+            if not writer.done:
+                return False, "El video es demasiado corto para este mensaje."
+            if encoder.returncode != 0:
+                return False, "Error al codificar el segmento con FFmpeg."
             
-            # Procesar frames
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                if not finished and bit_idx < total_bits:
-                    blue_channel = frame[:, :, 0].flatten()
-                    bits_needed = total_bits - bit_idx
-                    bits_to_write = min(len(blue_channel), bits_needed)
-                    msg_bits_chunk = bits[bit_idx : bit_idx + bits_to_write]
-                    bits_array = np.array([int(b) for b in msg_bits_chunk], dtype=np.uint8)
-                    blue_channel[:bits_to_write] = (blue_channel[:bits_to_write] & 254) | bits_array
-                    frame[:, :, 0] = blue_channel.reshape((height, width))
-                    bit_idx += bits_to_write
-                    if bit_idx >= total_bits:
-                        finished = True
+            if progress_callback:
+                progress_callback(85)
+            
+            # 2. Copiar el resto del video sin recodificar y concatenar
+            segments = [head_path]
+            if split_frame is not None:
+                tail_cmd = [
+                    'ffmpeg', '-y', '-v', 'error', '-i', video_path,
+                    '-ss', f'{split_time}', '-map', '0:v:0', '-c', 'copy',
+                    str(tail_path)
+                ]
+                result = subprocess.run(tail_cmd, capture_output=True, shell=_USE_SHELL)
+                if result.returncode != 0:
+                    return False, "Error al copiar el resto del video con FFmpeg."
+                segments.append(tail_path)
+            
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for segment in segments:
+                    f.write(f"file '{segment.resolve().as_posix()}'\n")
+            
+            concat_cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'concat', '-safe', '0', '-i', str(list_path),
+                '-i', video_path,
+                '-map', '0:v:0', '-map', '1:a?', '-c', 'copy',
+                output_path
+            ]
+            result = subprocess.run(concat_cmd, capture_output=True, shell=_USE_SHELL)
+            if result.returncode != 0:
+                self._remove_partial_output(output_path)
+                return False, "Error al concatenar los segmentos con FFmpeg."
+            
+            if progress_callback:
+                progress_callback(100)
+            
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            return True, (
+                f"✅ Mensaje oculto exitosamente (modo parcial).\n"
+                f"Guardado como: {Path(output_path).name}\n"
+                f"Tamaño: {size_mb:.2f} MB\n"
+                f"Cifrado: Fernet (AES-128)\n"
+                f"Códec: {stream['video_codec']}\n"
+                f"Frames reescritos: {frames_written} de {total_frames}"
+            )
+        finally:
+            for temp in (head_path, tail_path, list_path):
+                if temp.exists():
+                    temp.unlink()
+
+    def _remove_partial_output(self, output_path: str):
+        """Elimina la salida a medias de un backend que falló."""
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    def _hide_bits_ffmpeg_pipe(self, video_path: str, writer: '_LSBWriter', output_path: str,
+                               progress_callback=None, pipeline_queue_depth: int = 0) -> Tuple[bool, str]:
+        """
+        Backend de una sola pasada: un proceso FFmpeg decodifica a rawvideo por stdout,
+        los frames se modifican en memoria y otro proceso FFmpeg los codifica desde stdin,
+        copiando la pista de audio original (-c:a copy) en la misma invocación.
+        No genera archivos temporales.
+        """
+        if Path(output_path).suffix.lower() not in self.PIPE_CONTAINERS:
+            return False, (
+                f"El backend FFmpeg codifica en {self.PIPE_VIDEO_CODEC}: usa una salida "
+                f"{' o '.join(self.PIPE_CONTAINERS)}."
+            )
+        try:
+            stream = probe_media(video_path)
+        except ValueError:
+            return False, "No se pudo analizar el video con ffprobe."
+        
+        width, height = stream['width'], stream['height']
+        frame_rate = stream['r_frame_rate']
+        total_frames = stream['total_frames']
+        frame_size = width * height * 3
+        
+        decoder_cmd = [
+            'ffmpeg', '-v', 'error', '-i', video_path,
+            '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-'
+        ]
+        encoder_cmd = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            '-r', frame_rate, '-i', '-',
+            '-i', video_path,
+            '-map', '0:v:0', '-map', '1:a?',
+            '-c:v', self.PIPE_VIDEO_CODEC, '-pix_fmt', self.PIPE_PIX_FMT,
+            '-c:a', 'copy',
+            output_path
+        ]
+        decoder = subprocess.Popen(decoder_cmd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, shell=_USE_SHELL)
+        encoder = subprocess.Popen(encoder_cmd, stdin=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, shell=_USE_SHELL)
+        
+        frame_count = 0
+        encoder_closed = False
+        
+        def read_frame():
+            # Si el codificador terminó antes de tiempo, no seguir decodificando
+            if encoder_closed:
+                return None
+            raw = decoder.stdout.read(frame_size)
+            return raw if len(raw) == frame_size else None
+        
+        def process_frame(raw):
+            if not writer.done:
+                if writer.modifies_next_frame:
+                    frame = np.frombuffer(raw, dtype=np.uint8).reshape((height, width, 3)).copy()
+                    writer.embed(frame)
+                    raw = frame.tobytes()
+                else:
+                    writer.skip_frame()
+            return raw
+        
+        def write_frame(raw):
+            nonlocal frame_count, encoder_closed
+            if encoder_closed:
+                return
+            try:
+                encoder.stdin.write(raw)
+            except BrokenPipeError:
+                encoder_closed = True
+                return
+            frame_count += 1
+            if progress_callback and total_frames and frame_count % 10 == 0:
+                progress_callback(int(frame_count / total_frames * 95))
+        
+        try:
+            try:
+                stats = self._run_frame_pipeline(read_frame, process_frame, write_frame,
+                                                 pipeline_queue_depth)
+            finally:
+                decoder.stdout.close()
+                decoder.kill()
+                decoder.wait()
+                try:
+                    encoder.stdin.close()
+                except BrokenPipeError:
+                    encoder_closed = True
+                encoder.wait()
+        except Exception:
+            self._remove_partial_output(output_path)
+            raise
+        
+        if encoder_closed or encoder.returncode != 0:
+            self._remove_partial_output(output_path)
+            return False, "Error al codificar el video con FFmpeg."
+        if not writer.done:
+            self._remove_partial_output(output_path)
+            return False, "El video es demasiado corto para este mensaje."
+        
+        if progress_callback:
+            progress_callback(100)
+        
+        size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        return True, (
+            f"✅ Mensaje oculto exitosamente.\n"
+            f"Guardado como: {Path(output_path).name}\n"
+            f"Tamaño: {size_mb:.2f} MB\n"
+            f"Cifrado: Fernet (AES-128)\n"
+            f"Códec: {self.PIPE_VIDEO_CODEC} (FFmpeg pipe)\n"
+            f"Audio: copiado del original"
+            f"{self._format_pipeline_stats(stats) if pipeline_queue_depth else ''}"
+        )
+
+    def _set_start_frame(self, writer: '_LSBWriter', start_frame: int):
+        """Configura el escritor para empezar en start_frame, con índice en el frame 0."""
+        if start_frame < 0:
+            raise ValueError("El frame inicial no puede ser negativo")
+        if start_frame > 0:
+            writer.start_frame = start_frame
+            writer.index_builder = self._index_builder(start_frame, writer)
+
+    def _hide_with_writer(self, video_path: str, writer: '_LSBWriter', output_path: str,
+                          progress_callback=None, partial_reencode: bool = False,
+                          backend: str = 'opencv', pipeline_queue_depth: int = 0) -> Tuple[bool, str]:
+        """Envía el escritor LSB preparado al backend de video elegido."""
+        if partial_reencode:
+            return self._hide_bits_partial(video_path, writer, output_path, progress_callback)
+        if backend == 'ffmpeg':
+            return self._hide_bits_ffmpeg_pipe(video_path, writer, output_path, progress_callback,
+                                               pipeline_queue_depth)
+        if backend != 'opencv':
+            return False, f"Backend desconocido: {backend}"
+        return self._hide_bits_opencv(video_path, writer, output_path, progress_callback,
+                                      pipeline_queue_depth)
+
+    def _hide_bits_opencv(self, video_path: str, writer: '_LSBWriter', output_path: str,
+                          progress_callback=None, pipeline_queue_depth: int = 0) -> Tuple[bool, str]:
+        """
+        Backend por defecto: recodifica con cv2.VideoWriter (FFV1/XVID/MJPG) a un AVI
+        temporal y luego recupera el audio original con FFmpeg.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return False, "No se pudo abrir el video"
+            
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        # Crear archivo temporal sin audio
+        temp_video_path = str(self.temp_dir / f"temp_no_audio_{Path(output_path).name}")
+        
+        # Lista de códecs en orden de preferencia
+        codec_options = [
+            ('FFV1', '.avi'),
+            ('XVID', '.avi'),
+            ('MJPG', '.avi'),
+        ]
+        
+        fourcc = None
+        video_created = False
+        codec_name = None
+        
+        # Intentar con cada códec hasta que uno funcione
+        for codec_name, recommended_ext in codec_options:
+            try:
+                fourcc = cv2.VideoWriter_fourcc(*codec_name)
+                output_test = temp_video_path
+                if not temp_video_path.lower().endswith(recommended_ext):
+                    output_test = str(Path(temp_video_path).with_suffix(recommended_ext))
                 
-                out.write(frame)
-                frame_count += 1
+                out = cv2.VideoWriter(output_test, fourcc, fps, (width, height))
                 
-                if progress_callback and frame_count % 10 == 0:
-                    prog = int((frame_count / total_frames) * 50)
-                    progress_callback(prog)
-            
+                if out.isOpened():
+                    temp_video_path = output_test
+                    video_created = True
+                    break
+                else:
+                    out.release()
+            except Exception as e:
+                continue
+        
+        if not video_created:
+            cap.release()
+            return False, (
+                "No se pudo crear el video de salida.\n\n"
+                "Posibles soluciones:\n"
+                "1. Usa la extensión .avi en lugar de .mp4\n"
+                "2. Instala ffmpeg en el sistema\n"
+                "3. Verifica que el directorio de salida sea escribible"
+            )
+        
+        frame_count = 0
+        
+        # Procesar frames
+        def read_frame():
+            ret, frame = cap.read()
+            return frame if ret else None
+        
+        def process_frame(frame):
+            if not writer.done:
+                writer.embed(frame)
+            return frame
+        
+        def write_frame(frame):
+            nonlocal frame_count
+            out.write(frame)
+            frame_count += 1
+            if progress_callback and frame_count % 10 == 0:
+                prog = int((frame_count / total_frames) * 50)
+                progress_callback(prog)
+        
+        try:
+            stats = self._run_frame_pipeline(read_frame, process_frame, write_frame,
+                                             pipeline_queue_depth)
+        finally:
             cap.release()
             out.release()
+        
+        finished = writer.done
+        stats_text = self._format_pipeline_stats(stats) if pipeline_queue_depth else ""
+        
+        if not finished:
+            if os.path.exists(temp_video_path):
+                os.remove(temp_video_path)
+            return False, "El video es demasiado corto para este mensaje."
+        
+        # 3. Agregar audio usando FFmpeg
+        try:
+            if progress_callback:
+                progress_callback(60)
             
-            if not finished:
-                if os.path.exists(temp_video_path):
-                    os.remove(temp_video_path)
-                return False, "El video es demasiado corto para este mensaje."
+            # Extraer audio del video original
+            temp_audio_path = self._extract_audio_from_video(video_path)
             
-            # 3. Agregar audio usando FFmpeg
-            try:
+            if temp_audio_path and os.path.exists(temp_audio_path):
                 if progress_callback:
-                    progress_callback(60)
+                    progress_callback(70)
                 
-                # Extraer audio del video original
-                temp_audio_path = self._extract_audio_from_video(video_path)
+                # Ajustar extensión de salida
+                final_output = output_path
+                if not output_path.lower().endswith(('.mp4', '.avi', '.mkv')):
+                    final_output = str(Path(output_path).with_suffix('.mp4'))
                 
-                if temp_audio_path and os.path.exists(temp_audio_path):
+                # Combinar video procesado con audio original
+                if self._merge_audio_to_video(temp_video_path, temp_audio_path, final_output):
                     if progress_callback:
-                        progress_callback(70)
+                        progress_callback(100)
                     
-                    # Ajustar extensión de salida
-                    final_output = output_path
-                    if not output_path.lower().endswith(('.mp4', '.avi', '.mkv')):
-                        final_output = str(Path(output_path).with_suffix('.mp4'))
+                    # Limpiar archivos temporales
+                    if os.path.exists(temp_video_path):
+                        os.remove(temp_video_path)
+                    if os.path.exists(temp_audio_path):
+                        os.remove(temp_audio_path)
                     
-                    # Combinar video procesado con audio original
-                    if self._merge_audio_to_video(temp_video_path, temp_audio_path, final_output):
-                        if progress_callback:
-                            progress_callback(100)
-                        
-                        # Limpiar archivos temporales
-                        if os.path.exists(temp_video_path):
-                            os.remove(temp_video_path)
-                        if os.path.exists(temp_audio_path):
-                            os.remove(temp_audio_path)
-                        
-                        size_mb = os.path.getsize(final_output) / (1024 * 1024)
-                        
-                        return True, (
-                            f"✅ Mensaje oculto exitosamente.\n"
-                            f"Guardado como: {Path(final_output).name}\n"
-                            f"Tamaño: {size_mb:.2f} MB\n"
-                            f"Cifrado: Fernet (AES-128)\n"
-                            f"Códec: {codec_name}\n"
-                            f"Audio: Sí"
-                        )
-                    else:
-                        # Si falla merge, usar video sin audio
-                        import shutil
-                        shutil.move(temp_video_path, output_path)
-                        size_mb = os.path.getsize(output_path) / (1024 * 1024)
-                        
-                        return True, (
-                            f"⚠️ Mensaje oculto, pero sin audio.\n"
-                            f"Error al combinar audio con FFmpeg.\n"
-                            f"Guardado como: {Path(output_path).name}\n"
-                            f"Tamaño: {size_mb:.2f} MB\n"
-                            f"Códec: {codec_name}"
-                        )
-                else:
-                    # Video original sin audio
-                    import shutil
-                    shutil.move(temp_video_path, output_path)
-                    size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                    size_mb = os.path.getsize(final_output) / (1024 * 1024)
                     
                     return True, (
                         f"✅ Mensaje oculto exitosamente.\n"
-                        f"Guardado como: {Path(output_path).name}\n"
+                        f"Guardado como: {Path(final_output).name}\n"
                         f"Tamaño: {size_mb:.2f} MB\n"
                         f"Cifrado: Fernet (AES-128)\n"
                         f"Códec: {codec_name}\n"
-                        f"Audio: No (video original sin audio)"
+                        f"Audio: Sí"
+                        f"{stats_text}"
                     )
-                    
-            except Exception as audio_error:
-                # Si falla todo el proceso de audio
-                if os.path.exists(temp_video_path):
+                else:
+                    # Si falla merge, usar video sin audio
                     import shutil
                     shutil.move(temp_video_path, output_path)
-                
+                    size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                    
+                    return True, (
+                        f"⚠️ Mensaje oculto, pero sin audio.\n"
+                        f"Error al combinar audio con FFmpeg.\n"
+                        f"Guardado como: {Path(output_path).name}\n"
+                        f"Tamaño: {size_mb:.2f} MB\n"
+                        f"Códec: {codec_name}"
+                        f"{stats_text}"
+                    )
+            else:
+                # Video original sin audio
+                import shutil
+                shutil.move(temp_video_path, output_path)
                 size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                
                 return True, (
-                    f"⚠️ Mensaje oculto, pero sin audio.\n"
-                    f"Error: {str(audio_error)}\n"
+                    f"✅ Mensaje oculto exitosamente.\n"
                     f"Guardado como: {Path(output_path).name}\n"
                     f"Tamaño: {size_mb:.2f} MB\n"
-                    f"Códec: {codec_name}"
+                    f"Cifrado: Fernet (AES-128)\n"
+                    f"Códec: {codec_name}\n"
+                    f"Audio: No (video original sin audio)"
+                    f"{stats_text}"
                 )
+                
+        except Exception as audio_error:
+            # Si falla todo el proceso de audio
+            if os.path.exists(temp_video_path):
+                import shutil
+                shutil.move(temp_video_path, output_path)
+            
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            return True, (
+                f"⚠️ Mensaje oculto, pero sin audio.\n"
+                f"Error: {str(audio_error)}\n"
+                f"Guardado como: {Path(output_path).name}\n"
+                f"Tamaño: {size_mb:.2f} MB\n"
+                f"Códec: {codec_name}"
+                f"{stats_text}"
+            )
+
+    def hide_text_in_video(self, video_path: str, text: str, password: str, output_path: str, 
+                          progress_callback=None, partial_reencode: bool = False,
+                          backend: str = 'opencv', pipeline_queue_depth: int = 0,
+                          bits_per_channel: int = DEFAULT_BITS_PER_CHANNEL,
+                          channels: str = DEFAULT_CHANNELS, start_frame: int = 0,
+                          kdf_iterations: int = DEFAULT_KDF_ITERATIONS) -> Tuple[bool, str]:
+        """
+        Oculta texto cifrado en los frames usando LSB.
+        
+        Con partial_reencode=True solo se recodifican los frames que llevan el
+        mensaje y el resto del video se copia sin recodificar (ver _hide_bits_partial).
+        Con backend='ffmpeg' los frames se procesan en una sola pasada por pipes de
+        FFmpeg, sin archivos temporales (ver _hide_bits_ffmpeg_pipe).
+        Con pipeline_queue_depth > 0 la decodificación, la incrustación y la
+        codificación corren en hilos separados unidos por colas de ese tamaño.
+        bits_per_channel (1-4) y channels (subconjunto de 'BGR') fijan la densidad;
+        se registra en la cabecera para que la extracción la detecte sola.
+        Con start_frame > 0 el mensaje se coloca a partir de ese frame y el frame 0
+        lleva un índice para que la extracción salte directamente hasta él.
+        La clave se deriva con un salt aleatorio y kdf_iterations iteraciones,
+        ambos guardados delante del mensaje cifrado.
+        """
+        try:
+            # 1. Cifrar el mensaje
+            salt, iterations = self._new_kdf_params(kdf_iterations)
+            encrypted_message = self._encrypt_message(text, password, salt, iterations)
+            
+            # 2. Preparar el mensaje para incrustar
+            layout = self._parse_layout(bits_per_channel, channels)
+            header = self._header_bytes(len(encrypted_message), layout, flags=self.MODE_FLAG_KDF)
+            kdf_params = struct.pack(self.KDF_PARAMS_FORMAT, salt, iterations)
+            body = kdf_params + encrypted_message + self.MAGIC_END.encode()
+            writer = _LSBWriter(self._to_bits(header), body, layout)
+            self._set_start_frame(writer, start_frame)
+            
+            return self._hide_with_writer(video_path, writer, output_path, progress_callback,
+                                          partial_reencode, backend, pipeline_queue_depth)
             
         except Exception as e:
             return False, f"Error: {str(e)}"
 
     def extract_text_from_video(self, video_path: str, password: str, 
                                progress_callback=None) -> Tuple[bool, str, str]:
-        """Extrae y descifra texto oculto LSB."""
+        """
+        Extrae y descifra texto oculto LSB.
+        
+        Lee solo los bits necesarios: primero la cabecera (marcador + longitud)
+        y luego exactamente la longitud indicada, deteniendo la decodificación
+        de frames en cuanto el mensaje está completo.
+        """
         try:
             cap = cv2.VideoCapture(video_path)
             if not cap.isOpened():
                 return False, "No se pudo abrir el video", ""
+            
+            try:
+                reader = self._payload_reader(cap)
+                marker_bytes = self.MAGIC_MARKER.encode()
+                
+                # 1. Cabecera: marcador + [modo] + longitud (16 caracteres numéricos)
+                header_bits = np.empty((len(marker_bytes) + 16) * 8, dtype=np.uint8)
+                if not reader.read_into(header_bits):
+                    return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
+                
+                header = self._from_bits(header_bits)
+                if not header.startswith(marker_bytes):
+                    return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
                 
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                # 2. Detectar densidad y leer longitud
+                fields = header[len(marker_bytes):]
+                flags = 0
+                try:
+                    if fields.isdigit():
+                        # Formato original: 1 LSB del canal azul
+                        layout = self._parse_layout(self.DEFAULT_BITS_PER_CHANNEL, self.DEFAULT_CHANNELS)
+                    else:
+                        layout = self._layout_from_mode_bytes(fields[0], fields[1])
+                        flags = fields[1]
+                        extra_bits = np.empty(16, dtype=np.uint8)
+                        if not reader.read_into(extra_bits):
+                            return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
+                        fields = fields[2:] + self._from_bits(extra_bits)
+                    msg_length = int(fields.decode('ascii'))
+                except ValueError:
+                    return False, "Error al leer la longitud del mensaje", ""
+                # La longitud no puede superar lo que cabe en el video (acota el búfer)
+                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                bits_per_pixel = layout[0] * len(layout[1])
+                max_bytes = (reader.pixels * max(total_frames, 1) * bits_per_pixel) // 8
+                if msg_length <= 0 or msg_length > max_bytes:
+                    return False, "Error al leer la longitud del mensaje", ""
+                
+                salt, iterations = self.LEGACY_SALT, self.DEFAULT_KDF_ITERATIONS
+                if flags & self.MODE_FLAG_KDF:
+                    kdf_bits = np.empty(struct.calcsize(self.KDF_PARAMS_FORMAT) * 8, dtype=np.uint8)
+                    if not reader.read_into(kdf_bits, layout=layout):
+                        return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
+                    try:
+                        salt, iterations = self._parse_kdf_params(self._from_bits(kdf_bits))
+                    except ValueError:
+                        return False, "❌ Mensaje corrupto (parámetros de clave inválidos)", ""
+                
+                # 3. Leer exactamente el mensaje encriptado
+                msg_bits = np.empty(msg_length * 8, dtype=np.uint8)
+                
+                def report(filled):
+                    if progress_callback:
+                        progress_callback(int(filled / len(msg_bits) * 100))
+                
+                if not reader.read_into(msg_bits, report, layout):
+                    return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
+            finally:
+                cap.release()
+            
+            encrypted_data = self._from_bits(msg_bits)
+            try:
+                # Desencriptar con la contraseña
+                secret_text = self._decrypt_message(encrypted_data, password, salt, iterations)
+                if progress_callback:
+                    progress_callback(100)
+                return True, "✅ Mensaje recuperado y desencriptado con éxito", secret_text
+            except Exception:
+                return False, f"❌ Error al desencriptar: Contraseña incorrecta o mensaje corrupto", ""
+            
+        except Exception as e:
+            return False, f"Error de extracción: {str(e)}", ""
+
+
+    def _fernet_token_len(self, plain_len: int) -> int:
+        """Longitud exacta del token Fernet para un texto plano de plain_len bytes."""
+        raw_len = 1 + 8 + 16 + 16 * (plain_len // 16 + 1) + 32
+        return 4 * (-(-raw_len // 3))
+
+    def _iter_source_chunks(self, source, chunk_size: int):
+        """Recorre `source` (ruta o iterable de bytes) en bloques de exactamente chunk_size bytes."""
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        return
+                    yield data
+        else:
+            # Buffer mutable: cada byte se copia un número constante de veces
+            pending = bytearray()
+            for data in source:
+                pending += data
+                while len(pending) >= chunk_size:
+                    yield bytes(pending[:chunk_size])
+                    del pending[:chunk_size]
+            if pending:
+                yield bytes(pending)
+
+    def _encrypt_stream(self, chunks, cipher: Fernet):
+        """
+        Cifra cada bloque por separado y produce registros: longitud del token (4 bytes)
+        + token. El texto plano lleva índice (8 bytes) y marca de último bloque (1 byte),
+        de modo que no se pueden reordenar ni truncar bloques sin detectarlo.
+        """
+        index = 0
+        current = next(chunks, b'')
+        while True:
+            following = next(chunks, None)
+            final = following is None
+            plain = index.to_bytes(8, 'big') + bytes([final]) + current
+            token = cipher.encrypt(plain)
+            yield len(token).to_bytes(4, 'big') + token
+            if final:
+                return
+            current = following
+            index += 1
+
+    def _stream_body_size(self, source_size: int, chunk_size: int) -> int:
+        """Tamaño total de los registros cifrados para un origen de source_size bytes."""
+        full, rest = divmod(source_size, chunk_size)
+        sizes = [chunk_size] * full + ([rest] if rest or not full else [])
+        return sum(4 + self._fernet_token_len(9 + size) for size in sizes)
+
+    def hide_bytes_in_video(self, video_path: str, source, password: str, output_path: str,
+                            progress_callback=None, chunk_size: int = STREAM_CHUNK_SIZE,
+                            partial_reencode: bool = False, backend: str = 'opencv',
+                            pipeline_queue_depth: int = 0,
+                            bits_per_channel: int = DEFAULT_BITS_PER_CHANNEL,
+                            channels: str = DEFAULT_CHANNELS, start_frame: int = 0,
+                            kdf_iterations: int = DEFAULT_KDF_ITERATIONS) -> Tuple[bool, str]:
+        """
+        Oculta contenido binario leyendo y cifrando por bloques a medida que se
+        generan los frames, con memoria constante.
+        
+        Args:
+            source: Ruta de archivo o iterable de bloques de bytes
+            chunk_size: Tamaño de cada bloque cifrado (autenticado por separado)
+        
+        El resto de opciones son las de hide_text_in_video. El modo parcial
+        requiere que `source` sea una ruta (para conocer el tamaño de antemano).
+        """
+        try:
+            if not 0 < chunk_size <= self.MAX_STREAM_CHUNK_SIZE:
+                return False, (f"El tamaño de bloque debe estar entre 1 y "
+                               f"{self.MAX_STREAM_CHUNK_SIZE} bytes")
             
-            extracted_bits = ""
-            marker_len_bits = len(self._to_bin(self.MAGIC_MARKER))
+            layout = self._parse_layout(bits_per_channel, channels)
+            header = self._header_bytes(chunk_size, layout, self.STREAM_MARKER, self.MODE_FLAG_KDF)
+            salt, iterations = self._new_kdf_params(kdf_iterations)
+            kdf_params = struct.pack(self.KDF_PARAMS_FORMAT, salt, iterations)
+            cipher = Fernet(self._derive_key(password, salt, iterations))
             
-            # Variables de estado
-            found_marker = False
-            msg_length = 0
-            frame_count = 0
+            body_size = None
+            if isinstance(source, (str, Path)):
+                body_size = len(kdf_params) + self._stream_body_size(os.path.getsize(source), chunk_size)
             
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Extraer LSB del canal azul
-                blue_channel = frame[:, :, 0].flatten()
+            records = self._encrypt_stream(self._iter_source_chunks(source, chunk_size), cipher)
+            body = itertools.chain([kdf_params], records)
+            writer = _LSBWriter(self._to_bits(header), body, layout, body_size)
+            self._set_start_frame(writer, start_frame)
+            
+            return self._hide_with_writer(video_path, writer, output_path, progress_callback,
+                                          partial_reencode, backend, pipeline_queue_depth)
+            
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+
+    def extract_bytes_from_video(self, video_path: str, password: str, destination,
+                                 progress_callback=None) -> Tuple[bool, str]:
+        """
+        Extrae contenido binario oculto con hide_bytes_in_video, descifrando bloque
+        a bloque mientras se decodifican los frames.
+        
+        Args:
+            destination: Ruta del archivo de salida u objeto con método write()
+        
+        Returns:
+            Tuple[bool, str]: (éxito, mensaje)
+        """
+        to_path = isinstance(destination, (str, Path))
+        part_path = f"{destination}.part" if to_path else None
+        out = None
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return False, "No se pudo abrir el video"
+            
+            try:
+                total_frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 1)
+                reader = self._payload_reader(cap)
+                marker_bytes = self.STREAM_MARKER.encode()
                 
-                # Obtener solo el último bit: pixel & 1
-                lsb_bits = (blue_channel & 1)
+                # 1. Cabecera: marcador + modo + tamaño de bloque
+                header_bits = np.empty((len(marker_bytes) + 18) * 8, dtype=np.uint8)
+                if not reader.read_into(header_bits):
+                    return False, "⚠️ No se encontró contenido oculto o video incompleto"
+                header = self._from_bits(header_bits)
+                if not header.startswith(marker_bytes):
+                    if header.startswith(self.MAGIC_MARKER.encode()):
+                        return False, "⚠️ El video contiene un mensaje de texto, no contenido binario"
+                    return False, "⚠️ No se encontró contenido oculto o video incompleto"
                 
-                # Convertir a string de bits '0'/'1'
-                bits_str = "".join(lsb_bits.astype(str))
-                extracted_bits += bits_str
+                fields = header[len(marker_bytes):]
+                try:
+                    layout = self._layout_from_mode_bytes(fields[0], fields[1])
+                    chunk_size = int(fields[2:].decode('ascii'))
+                except ValueError:
+                    return False, "Error al leer la cabecera del contenido"
+                # El bloque no puede superar lo que cabe en el video ni la cota fija
+                # (acota el búfer del token antes de autenticar nada)
+                bits_per_pixel = layout[0] * len(layout[1])
+                max_bytes = (reader.pixels * total_frames * bits_per_pixel) // 8
+                if not 0 < chunk_size <= min(max_bytes, self.MAX_STREAM_CHUNK_SIZE):
+                    return False, "Error al leer la cabecera del contenido"
+                max_token = self._fernet_token_len(9 + chunk_size)
                 
-                # Lógica de procesamiento de flujo
-                # 1. Buscar marcador inicial
-                if not found_marker and len(extracted_bits) >= marker_len_bits + 128:
+                salt, iterations = self.LEGACY_SALT, self.DEFAULT_KDF_ITERATIONS
+                if fields[1] & self.MODE_FLAG_KDF:
+                    kdf_bits = np.empty(struct.calcsize(self.KDF_PARAMS_FORMAT) * 8, dtype=np.uint8)
+                    if not reader.read_into(kdf_bits, layout=layout):
+                        return False, "⚠️ Contenido incompleto: el video terminó antes de tiempo"
                     try:
-                        # Chequeamos si encontramos el marcador
-                        temp_text = self._bin_to_str(extracted_bits[:marker_len_bits + 128])
-                        if self.MAGIC_MARKER in temp_text:
-                            found_marker = True
-                            # Recortar los bits hasta donde termina el marker
-                            marker_idx = temp_text.find(self.MAGIC_MARKER)
-                            bit_offset = (marker_idx + len(self.MAGIC_MARKER)) * 8
-                            extracted_bits = extracted_bits[bit_offset:]
-                    except:
-                        pass
-                            
-                # 2. Leer longitud (16 caracteres numéricos = 128 bits)
-                if found_marker and msg_length == 0:
-                    if len(extracted_bits) >= 128:
-                        length_bits = extracted_bits[:128]
-                        try:
-                            length_str = self._bin_to_str(length_bits)
-                            msg_length = int(length_str)
-                            extracted_bits = extracted_bits[128:]  # Remover bits de longitud
-                        except:
-                            cap.release()
-                            return False, "Error al leer la longitud del mensaje", ""
-
-                # 3. Leer el mensaje encriptado
-                if found_marker and msg_length > 0:
-                    needed_bits = msg_length * 8
-                    if len(extracted_bits) >= needed_bits:
-                        final_msg_bits = extracted_bits[:needed_bits]
-                        
-                        # Convertir bits a bytes
-                        encrypted_data = bytes([int(final_msg_bits[i:i+8], 2) 
-                                               for i in range(0, len(final_msg_bits), 8)])
-                        
-                        try:
-                            # Desencriptar con la contraseña
-                            secret_text = self._decrypt_message(encrypted_data, password)
-                            cap.release()
-                            return True, "✅ Mensaje recuperado y desencriptado con éxito", secret_text
-                        except Exception as decrypt_error:
-                            cap.release()
-                            return False, f"❌ Error al desencriptar: Contraseña incorrecta o mensaje corrupto", ""
+                        salt, iterations = self._parse_kdf_params(self._from_bits(kdf_bits))
+                    except ValueError:
+                        return False, "❌ Contenido corrupto (parámetros de clave inválidos)"
                 
-                frame_count += 1
-                if progress_callback and frame_count % 10 == 0:
-                    prog = int((frame_count / total_frames) * 100)
-                    progress_callback(prog)
-            
-            cap.release()
-            return False, "⚠️ No se encontró mensaje oculto o video incompleto", ""
+                # 2. Registros cifrados, uno por bloque
+                cipher = Fernet(self._derive_key(password, salt, iterations))
+                out = open(part_path, 'wb') if to_path else destination
+                length_bits = np.empty(32, dtype=np.uint8)
+                index = 0
+                total_bytes = 0
+                while True:
+                    if not reader.read_into(length_bits, layout=layout):
+                        return False, "⚠️ Contenido incompleto: el video terminó antes de tiempo"
+                    token_len = int.from_bytes(self._from_bits(length_bits), 'big')
+                    if not 0 < token_len <= max_token:
+                        return False, "❌ Contenido corrupto (longitud de bloque inválida)"
+                    
+                    token_bits = np.empty(token_len * 8, dtype=np.uint8)
+                    if not reader.read_into(token_bits, layout=layout):
+                        return False, "⚠️ Contenido incompleto: el video terminó antes de tiempo"
+                    try:
+                        plain = cipher.decrypt(self._from_bits(token_bits))
+                    except InvalidToken:
+                        return False, "❌ Error al desencriptar: Contraseña incorrecta o contenido corrupto"
+                    
+                    if int.from_bytes(plain[:8], 'big') != index:
+                        return False, "❌ Contenido corrupto (bloques fuera de orden)"
+                    out.write(plain[9:])
+                    total_bytes += len(plain) - 9
+                    index += 1
+                    
+                    if progress_callback:
+                        progress_callback(min(99, int(reader.frames_read / total_frames * 100)))
+                    if plain[8]:
+                        break
+            finally:
+                cap.release()
+                if to_path and out is not None:
+                    out.close()
             
+            if to_path:
+                os.replace(part_path, destination)
+            if progress_callback:
+                progress_callback(100)
+            return True, (
+                f"✅ Contenido recuperado y desencriptado con éxito\n"
+                f"Tamaño: {total_bytes / 1024:.2f} KB en {index} bloques"
+            )
+        
         except Exception as e:
-            return False, f"Error de extracción: {str(e)}", ""
\ No newline at end of file
+            return False, f"Error de extracción: {str(e)}"
+        finally:
+            if to_path and os.path.exists(part_path):
+                os.remove(part_path)
+
+
+class _LSBWriter:
+    """
+    Escritor incremental de bits LSB.
+    
+    La cabecera se escribe con 1 LSB del canal azul desde el píxel 0 del primer
+    frame; el cuerpo continúa en los píxeles siguientes con la densidad pedida
+    (n bits por canal en los canales indicados, píxel a píxel en orden de fila).
+    El cuerpo puede ser bytes o un iterable de bloques de bytes, que se consume
+    bajo demanda a medida que se procesan los frames.
+    """
+    
+    def __init__(self, header_bits: np.ndarray, body, layout: Tuple[int, Tuple[int, ...]],
+                 body_size: Optional[int] = None):
+        self.bits_per_channel, self.channels = layout
+        self.bits_per_pixel = self.bits_per_channel * len(self.channels)
+        self.header_bits = header_bits
+        self.keep_mask = np.uint8(0xFF ^ ((1 << self.bits_per_channel) - 1))
+        self._weights = (1 << np.arange(self.bits_per_channel - 1, -1, -1)).astype(np.uint8)
+        
+        if isinstance(body, (bytes, bytearray)):
+            body_size = len(body)
+            body = [bytes(body)]
+        self.body_size = body_size
+        self._chunks = iter(body)
+        self._pending = b''
+        self._values = np.empty((0, len(self.channels)), dtype=np.uint8)
+        self._value_idx = 0
+        self._exhausted = False
+        
+        self.header_written = False
+        
+        # Frame desde el que se escribe el contenido; si es > 0, index_builder
+        # genera los bits del índice que se escriben en el frame 0
+        self.start_frame = 0
+        self.index_builder = None
+        self.frame_index = 0
+    
+    @property
+    def modifies_next_frame(self) -> bool:
+        """Indica si el próximo frame recibirá bits (índice o contenido)."""
+        return self.frame_index == 0 or self.frame_index >= self.start_frame
+    
+    def skip_frame(self):
+        """Avanza un frame sin modificarlo (solo válido si modifies_next_frame es False)."""
+        self.frame_index += 1
+    
+    def _to_values(self, data: bytes) -> np.ndarray:
+        """Agrupa los bits de `data` en valores de n bits por canal (rellena hasta un píxel entero)."""
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+        pad = (-len(bits)) % self.bits_per_pixel
+        if pad:
+            bits = np.concatenate((bits, np.zeros(pad, dtype=np.uint8)))
+        return (bits.reshape(-1, len(self.channels), self.bits_per_channel)
+                * self._weights).sum(axis=2, dtype=np.uint8)
+    
+    def _refill(self):
+        """Convierte más bloques del cuerpo hasta tener valores pendientes o agotar la fuente."""
+        # bits_per_pixel bytes equivalen exactamente a 8 píxeles: así no quedan píxeles a medias
+        group = self.bits_per_pixel
+        while self._value_idx >= len(self._values) and not self._exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+                data, self._pending = self._pending, b''
+            else:
+                data = self._pending + bytes(chunk)
+                cut = len(data) - len(data) % group
+                data, self._pending = data[:cut], data[cut:]
+            if data:
+                self._values = self._to_values(data)
+                self._value_idx = 0
+    
+    @property
+    def done(self) -> bool:
+        if not self.header_written:
+            return False
+        self._refill()
+        return self._exhausted and self._value_idx >= len(self._values)
+    
+    def frames_needed(self, pixels_per_frame: int) -> int:
+        """Número de frames necesarios para escribir cabecera y cuerpo (requiere body_size)."""
+        if self.body_size is None:
+            raise ValueError("Se desconoce el tamaño del contenido a ocultar")
+        body_pixels = -(-self.body_size * 8 // self.bits_per_pixel)
+        total_pixels = len(self.header_bits) + body_pixels
+        return self.start_frame + -(-total_pixels // pixels_per_frame)
+    
+    def embed(self, frame: np.ndarray):
+        """Escribe en `frame` (en su lugar) todos los bits pendientes que quepan."""
+        flat = frame.reshape(-1, 3)
+        pos = 0
+        
+        frame_index = self.frame_index
+        self.frame_index += 1
+        if frame_index < self.start_frame:
+            if frame_index == 0 and self.index_builder:
+                index_bits = self.index_builder(len(flat))
+                flat[:len(index_bits), 0] = (flat[:len(index_bits), 0] & 254) | index_bits
+            return
+        
+        if not self.header_written:
+            n = len(self.header_bits)
+            if len(flat) < n:
+                raise ValueError("El frame es demasiado pequeño para la cabecera")
+            flat[:n, 0] = (flat[:n, 0] & 254) | self.header_bits
+            pos = n
+            self.header_written = True
+        
+        while pos < len(flat):
+            self._refill()
+            take = min(len(flat) - pos, len(self._values) - self._value_idx)
+            if take <= 0:
+                break
+            values = self._values[self._value_idx:self._value_idx + take]
+            if self.channels == (0,):
+                flat[pos:pos + take, 0] = (flat[pos:pos + take, 0] & self.keep_mask) | values[:, 0]
+            else:
+                region = flat[pos:pos + take][:, self.channels]
+                flat[pos:pos + take, self.channels] = (region & self.keep_mask) | values
+            self._value_idx += take
+            pos += take
+
+
+class _LSBReader:
+    """
+    Lector incremental de bits LSB.
+    
+    Decodifica frames solo cuando se necesitan más bits y conserva la
+    posición (en píxeles) dentro del frame actual entre lecturas consecutivas.
+    """
+    
+    def __init__(self, cap):
+        self.cap = cap
+        self.flat = None
+        self.pixels = 0
+        self.pos = 0
+        self.frames_read = 0
+        # Bits sobrantes del último píxel leído (cuando una lectura no termina en límite de píxel)
+        self.carry = np.empty(0, dtype=np.uint8)
+        # Nº de frames del contenido según el índice (None si no hay índice)
+        self.frame_limit = None
+    
+    def read_into(self, out: np.ndarray, progress_callback=None,
+                  layout: Tuple[int, Tuple[int, ...]] = (1, (0,))) -> bool:
+        """
+        Llena `out` con los siguientes bits usando la densidad `layout`
+        (bits por canal, canales). Retorna False si el video termina antes.
+        """
+        bits_per_channel, channels = layout
+        bits_per_pixel = bits_per_channel * len(channels)
+        shifts = np.arange(bits_per_channel - 1, -1, -1, dtype=np.uint8)
+        mask = np.uint8((1 << bits_per_channel) - 1)
+        
+        filled = min(len(out), len(self.carry))
+        out[:filled] = self.carry[:filled]
+        self.carry = self.carry[filled:]
+        
+        while filled < len(out):
+            if self.pos >= self.pixels:
+                if self.frame_limit is not None and self.frames_read >= self.frame_limit:
+                    return False
+                ret, frame = self.cap.read()
+                if not ret:
+                    return False
+                self.flat = frame.reshape(-1, 3)
+                self.pixels = len(self.flat)
+                self.pos = 0
+                self.frames_read += 1
+                if progress_callback:
+                    progress_callback(filled)
+            
+            needed = len(out) - filled
+            take_px = min(-(-needed // bits_per_pixel), self.pixels - self.pos)
+            region = self.flat[self.pos:self.pos + take_px]
+            if layout == (1, (0,)):
+                bits = region[:, 0] & 1
+            else:
+                values = region[:, channels] & mask
+                bits = ((values[..., None] >> shifts) & 1).reshape(-1)
+            take = min(needed, len(bits))
+            out[filled:filled + take] = bits[:take]
+            self.carry = bits[take:].copy()
+            self.pos += take_px
+            filled += take
+        return True
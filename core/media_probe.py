@@ -0,0 +1,229 @@
+"""
+Módulo para obtener la información básica de un video (resolución, fps, frames,
+duración y pista de audio) con una sola consulta y cachearla.
+
+Primero se lee la cabecera del contenedor en Python puro (MP4/MOV, Matroska, AVI);
+ffprobe y OpenCV quedan como respaldo para formatos desconocidos o cuando se
+necesita el formato de píxel.
+
+La caché se indexa por (ruta, tamaño, mtime), de modo que un archivo modificado
+se vuelve a analizar automáticamente.
+"""
+
+import copy
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import cv2
+
+from core.container_probe import parse_container
+
+# En Windows shell=True ayuda a encontrar FFmpeg en el PATH; en otros sistemas rompe las listas de argumentos
+_USE_SHELL = os.name == 'nt'
+
+
+class MediaProbe:
+    """Analiza videos con ffprobe (u OpenCV como respaldo) y cachea el resultado."""
+
+    def __init__(self, max_entries: int = 256, cache_file: Optional[str] = None):
+        """
+        Args:
+            max_entries: Máximo de entradas en la caché LRU en memoria
+            cache_file: Archivo JSON opcional para persistir la caché en disco
+        """
+        self.max_entries = max_entries
+        self.cache_file = Path(cache_file) if cache_file else None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_loaded = False
+
+    def _cache_key(self, path: str) -> str:
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def _load_disk_cache(self):
+        """Carga la caché de disco una sola vez (si está configurada)."""
+        if self._disk_loaded or not self.cache_file:
+            return
+        self._disk_loaded = True
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            for key, info in list(entries.items())[-self.max_entries:]:
+                self._cache[key] = info
+        except (OSError, ValueError):
+            pass
+
+    def _save_disk_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            tmp_path = self.cache_file.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+    def probe(self, path: str, detailed: bool = False) -> dict:
+        """
+        Retorna la información del video:
+        width, height, fps, total_frames, duration_seconds, video_codec, pix_fmt,
+        r_frame_rate, has_audio, audio (codec, sample_rate, channels) o None,
+        y source ('header', 'ffprobe' u 'opencv').
+
+        Args:
+            path: Ruta del video
+            detailed: Si es True se usa ffprobe aunque la cabecera baste, para
+                      obtener también pix_fmt (la cabecera no lo incluye)
+
+        Raises:
+            ValueError: si el archivo no existe o no se puede analizar
+        """
+        if not os.path.exists(path):
+            raise ValueError("El archivo no existe")
+        key = self._cache_key(path)
+
+        with self._lock:
+            self._load_disk_cache()
+            cached = self._cache.get(key)
+            if cached is not None and not (detailed and cached.get('source') == 'header'):
+                self._cache.move_to_end(key)
+                return copy.deepcopy(cached)
+
+        if detailed:
+            info = self._probe_ffprobe(path) or cached or self._probe_header(path)
+        else:
+            info = self._probe_header(path) or self._probe_ffprobe(path)
+        info = info or self._probe_opencv(path)
+        if info is None:
+            raise ValueError("No se pudo abrir el video para leer metadata")
+
+        with self._lock:
+            self._cache[key] = info
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._save_disk_cache()
+        return copy.deepcopy(info)
+
+    def clear(self):
+        """Vacía la caché en memoria (la de disco se sobrescribe en el siguiente análisis)."""
+        with self._lock:
+            self._cache.clear()
+
+    def _probe_header(self, path: str) -> Optional[dict]:
+        """Lee solo la cabecera del contenedor (milisegundos, sin decodificador)."""
+        info = parse_container(path)
+        if info is not None:
+            info['source'] = 'header'
+        return info
+
+    def _probe_ffprobe(self, path: str) -> Optional[dict]:
+        """Analiza el archivo con una sola llamada a ffprobe."""
+        try:
+            cmd = [
+                'ffprobe', '-v', 'error', '-of', 'json',
+                '-show_entries',
+                'format=duration:stream=codec_type,codec_name,pix_fmt,width,height,'
+                'r_frame_rate,nb_frames,duration,sample_rate,channels',
+                path
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True, shell=_USE_SHELL)
+            if result.returncode != 0:
+                return None
+            data = json.loads(result.stdout)
+        except (OSError, ValueError):
+            return None
+
+        streams = data.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        if video is None:
+            return None
+
+        r_frame_rate = video.get('r_frame_rate', '0/1')
+        num, _, den = r_frame_rate.partition('/')
+        try:
+            fps = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            fps = 0.0
+
+        duration = _to_float(video.get('duration')) or _to_float(data.get('format', {}).get('duration'))
+        total_frames = _to_int(video.get('nb_frames')) or int(round(duration * fps))
+
+        return {
+            'width': int(video.get('width', 0)),
+            'height': int(video.get('height', 0)),
+            'fps': fps,
+            'r_frame_rate': r_frame_rate,
+            'total_frames': total_frames,
+            'duration_seconds': duration if duration else (total_frames / fps if fps > 0 else 0),
+            'video_codec': video.get('codec_name'),
+            'pix_fmt': video.get('pix_fmt'),
+            'has_audio': audio is not None,
+            'audio': {
+                'codec': audio.get('codec_name'),
+                'sample_rate': _to_int(audio.get('sample_rate')),
+                'channels': _to_int(audio.get('channels')),
+            } if audio else None,
+            'source': 'ffprobe',
+        }
+
+    def _probe_opencv(self, path: str) -> Optional[dict]:
+        """Respaldo sin FFmpeg: solo datos de video, la pista de audio queda desconocida."""
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            return None
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        return {
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'r_frame_rate': f"{fps}",
+            'total_frames': total_frames,
+            'duration_seconds': total_frames / fps if fps > 0 else 0,
+            'video_codec': None,
+            'pix_fmt': None,
+            'has_audio': None,
+            'audio': None,
+            'source': 'opencv',
+        }
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+# Instancia compartida por FrameStegano, FileStegano y AudioStegano
+_default_probe = MediaProbe()
+
+
+def probe_media(path: str, detailed: bool = False) -> dict:
+    """Analiza `path` usando la caché compartida (ver MediaProbe.probe)."""
+    return _default_probe.probe(path, detailed)
+
+
+def configure_probe_cache(max_entries: int = 256, cache_file: Optional[str] = None):
+    """Reemplaza la caché compartida (p. ej. para persistirla en disco en trabajos por lotes)."""
+    global _default_probe
+    _default_probe = MediaProbe(max_entries=max_entries, cache_file=cache_file)